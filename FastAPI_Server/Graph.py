@@ -1,8 +1,6 @@
 from typing_extensions import TypedDict
 from typing import Dict, List, Any
-from langchain_groq import ChatGroq
 from pydantic import BaseModel, Field
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import (
     HumanMessage,
     SystemMessage,
@@ -13,7 +11,6 @@ from langchain_core.messages import (
 from langgraph.graph import StateGraph, START, END
 
 # from langgraph.checkpoint.redis import RedisSaver
-from IPython.display import Image, display
 from typing import Annotated
 from typing import Any
 import operator
@@ -30,17 +27,15 @@ from Tools.general_qna import gen_qna
 from Tools.Image_qna import image_qna
 from Tools.refiner import ContentRefiner
 from Tools.prompt import ROUTER_PROMPT
-
-
-from mem0 import MemoryClient
-
-memory = MemoryClient()
+from Tools.lazy import LazyResource
 
 
 class GraphState(TypedDict, total=False):
     input: str
     uploaded_doc: str
-    uploaded_img: str
+    uploaded_doc_hash: str
+    uploaded_img: str  # single image, from checkpoints written before uploaded_imgs
+    uploaded_imgs: List[Dict[str, str]]
     agent_order: List[Dict[str, str]]
     routing_reasoning: str
     current_agent_index: int
@@ -54,9 +49,17 @@ class GraphState(TypedDict, total=False):
     past_memory: str
 
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash", temperature=0, google_api_key=os.getenv("GOOGLE_API_KEY")
-)
+def _load_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.0-flash",
+        temperature=0,
+        google_api_key=os.getenv("GOOGLE_API_KEY"),
+    )
+
+
+llm = LazyResource("graph_llm", _load_llm)
 
 
 def format_history(history: List[BaseMessage]) -> str:
@@ -68,6 +71,17 @@ def format_history(history: List[BaseMessage]) -> str:
     return formatted.strip()
 
 
+def uploaded_images(state: GraphState) -> List[Dict[str, str]]:
+    """The images uploaded in this thread, as {"id", "name", "path"} dicts."""
+    images = state.get("uploaded_imgs")
+    if images:
+        return images
+    legacy = state.get("uploaded_img")
+    if legacy:
+        return [{"id": "img-1", "name": os.path.basename(legacy), "path": legacy}]
+    return []
+
+
 # def load_memory(state: GraphState) -> GraphState:
 #     """
 #     Loads summarized memory and full conversation (if stored) for the given user/session
@@ -105,6 +119,9 @@ def Router(state: GraphState) -> GraphState:
         history = format_history(state["messages"][-10:])
 
         final_query = f"User Query: {query}\n\n Conversation History:\n{history}\n\n Summarized Memory:\n{previous_memory}\n"
+        images = [{"id": img["id"], "name": img["name"]} for img in uploaded_images(state)]
+        if images:
+            final_query += f"\n Uploaded Images: {json.dumps(images)}\n"
 
         # print("query received")
         messages = [
@@ -113,7 +130,7 @@ def Router(state: GraphState) -> GraphState:
         ]
         # print("query structured")
 
-        response = llm.invoke(messages)
+        response = llm.get().invoke(messages)
         raw = response.content.strip()
         if raw.startswith("```"):
             raw = re.sub(r"^```[a-z]*\n?", "", raw)
@@ -202,6 +219,7 @@ def Document_qna(state: GraphState) -> GraphState:
                 "query": query,
                 "dependency_context": dependencies_context,
                 "message_history": history,
+                "file_hash": state.get("uploaded_doc_hash") or "",
             }
         )
         # print(result)
@@ -321,12 +339,17 @@ def Image_qna(state: GraphState) -> GraphState:
                     print(f"Dependency {dep} output not found in agent_outputs")
         history = state["messages"][:-10]
 
-        # print(query)
-        uploaded_img = state["uploaded_img"]
-        # print(uploaded_doc_path)
+        # The router may name the images a sub-query is about; default to all.
+        images = uploaded_images(state)
+        targets = state["agent_order"][state["current_agent_index"]].get("images")
+        if targets:
+            selected = [img for img in images if img["id"] in targets]
+            if not selected:
+                print(f"Router targeted unknown images {targets}, using all")
+            images = selected or images
         response = image_qna.invoke(
             {
-                "uploaded_file": uploaded_img,
+                "uploaded_images": images,
                 "query": query,
                 "dependency_context": dependencies_context,
                 "message_history": history,
@@ -428,7 +451,7 @@ def Aggregator(state: GraphState) -> GraphState:
                 HumanMessage(content=aggregation_prompt),
             ]
 
-            response = llm(messages)
+            response = llm.get().invoke(messages)
             state["final_response"] = response.content
 
     except Exception as e:
@@ -1,127 +1,365 @@
+import time
+
+_import_started = time.perf_counter()
+
 import os
-import uuid
+import json
+import asyncio
 import tempfile
-import shutil
-from contextlib import asynccontextmanager
-from typing import Any, List
+import threading
+from collections import OrderedDict
+from contextlib import AsyncExitStack, aclosing, asynccontextmanager, nullcontext
+from typing import Any, AsyncContextManager, AsyncIterator, List, Optional
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
 from dotenv import load_dotenv
 
 from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from langgraph.pregel import Pregel
-from mem0 import MemoryClient
 
 from Graph import BuildGraph, GraphState
+from Tools.storage import UPLOADS_DIR, storage_manager
+from Tools.lazy import record_phase, startup_report, timed_phase, warm_up
+from Tools.cache import LRUCache, cache_stats
+from Tools.News import news_cache
+from Tools.extract_pool import extraction_pool
+from Tools.image_prep import prep_stats
+from Tools.proc_memory import default_web_concurrency, process_memory, worker_memory_report
+from Tools.uploads import (
+    MAX_DOCUMENT_BYTES,
+    MAX_IMAGE_BYTES,
+    MAX_REQUEST_UPLOAD_BYTES,
+    UploadTooLarge,
+    store_upload,
+)
+from Tools.memory_queue import MemoryWriteQueue
+from Tools.memory_relevance import select_memories
+from Tools.admission import ADMISSION_REQUEST_DEADLINE, AdmissionController, Rejected
+from Tools.jobs import (
+    FAILED,
+    JOB_MAX_PENDING_PER_USER,
+    JOB_POLL_INTERVAL,
+    QUEUED,
+    SUCCEEDED,
+    JobRunner,
+    JobStore,
+    RetryLater,
+)
+from Tools.conversation_store import (
+    SHORT_TERM_WINDOW,
+    ConversationStore,
+    SessionBusy,
+    load_conversation_backend,
+)
+from Tools.news_prefetch import (
+    NEWS_PREFETCH_ENABLED,
+    NEWS_PREFETCH_INTERVAL,
+    NEWS_PREFETCH_MEMORY_TOPICS,
+    NewsPrefetcher,
+)
+
+record_phase("imports", time.perf_counter() - _import_started)
 
 load_dotenv()
 
 SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "checkpoints.sqlite")
+STORAGE_SWEEP_INTERVAL = float(os.getenv("STORAGE_SWEEP_INTERVAL", 300))
+# Build models and API clients in the background right after startup, so the
+# first request does not pay for them. WARMUP_RESOURCES limits which ones.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+WARMUP_RESOURCES = [r for r in os.getenv("WARMUP_RESOURCES", "").split(",") if r]
+# Session memories are cached per (user, session). Writes from this process
+# invalidate the entry; the TTL bounds staleness from other workers' writes.
+MEMORY_CACHE_TTL = float(os.getenv("MEMORY_CACHE_TTL", 300))
+MEMORY_CACHE_BYTES = int(os.getenv("MEMORY_CACHE_BYTES", 16 * 1024 * 1024))
+# After Mem0 rejects a filtered fetch, use client-side filtering for this long.
+MEMORY_FILTER_RETRY_AFTER = float(os.getenv("MEMORY_FILTER_RETRY_AFTER", 600))
+# How long shutdown waits for queued memory writes to reach Mem0.
+MEMORY_FLUSH_TIMEOUT = float(os.getenv("MEMORY_FLUSH_TIMEOUT", 30))
+# Checkpoints scanned when rebuilding a session's recent messages.
+SHORT_TERM_REBUILD_SCAN = int(os.getenv("SHORT_TERM_REBUILD_SCAN", 200))
+# Graph runs allowed at once per worker; the rest queue briefly or get a 429.
+ADMISSION_INVOKE_CONCURRENCY = int(os.getenv("ADMISSION_INVOKE_CONCURRENCY", 8))
+ADMISSION_FILES_CONCURRENCY = int(os.getenv("ADMISSION_FILES_CONCURRENCY", 2))
+# Batches run at once per worker; a further batch is refused with a 429.
+ADMISSION_BATCH_CONCURRENCY = int(os.getenv("ADMISSION_BATCH_CONCURRENCY", 1))
+# Graph runs in flight per batch; items of one session always run in order.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 1000))
 
 sqlite_checkpointer: AsyncSqliteSaver | None = None
 graph: Pregel | None = None
-memory_client: MemoryClient | None = None
+memory_client: "MemoryClient | None" = None
 memory_manager = None  # Add this global
+news_prefetcher: NewsPrefetcher | None = None
+job_store: JobStore | None = None
+job_runner: JobRunner | None = None
+
+async def load_recent_messages(user_id: str, session_id: str) -> List[BaseMessage]:
+    """Recent turns of a session, read back from its graph checkpoints."""
+    config = {"configurable": {"thread_id": generate_thread_id(user_id, session_id)}}
+    turns = []
+    async for snapshot in graph.aget_state_history(config, limit=SHORT_TERM_REBUILD_SCAN):
+        # Only snapshots of finished runs hold a matching input and response.
+        if snapshot.next:
+            continue
+        turn = (snapshot.values.get("input"), snapshot.values.get("final_response"))
+        if all(turn) and (not turns or turns[-1] != turn):
+            turns.append(turn)
+        if len(turns) * 2 >= SHORT_TERM_WINDOW:
+            break
+
+    messages: List[BaseMessage] = []
+    for user_message, ai_response in reversed(turns):
+        messages.extend([HumanMessage(content=user_message), AIMessage(content=ai_response)])
+    return messages
 
 class ConversationMemoryManager:
-    def __init__(self, memory_client: MemoryClient):
+    def __init__(self, memory_client: "MemoryClient"):
         self.memory_client = memory_client
-        self.conversation_messages = {}
+        self.short_term = ConversationStore(load_recent_messages, load_conversation_backend())
+        # Read by the news prefetcher's thread, hence the lock.
+        self.recent_sessions: "OrderedDict[tuple, float]" = OrderedDict()
+        self.recent_lock = threading.Lock()
+        self.session_memories = LRUCache("session_memories", max_bytes=MEMORY_CACHE_BYTES)
+        self.filters_disabled_until = 0.0
+        self.writer = MemoryWriteQueue(
+            self.write_messages,
+            on_written=lambda user_id, session_id: self.session_memories.discard(
+                (user_id, session_id)
+            ),
+        )
     
     def get_conversation_key(self, user_id: str, session_id: str) -> str:
         return f"{user_id}_{session_id}"
     
-    async def load_conversation_context(self, user_id: str, session_id: str) -> dict:
+    def mark_active(self, user_id: str, session_id: str):
+        key = (user_id, session_id)
+        with self.recent_lock:
+            self.recent_sessions[key] = time.time()
+            self.recent_sessions.move_to_end(key)
+            while len(self.recent_sessions) > 100:
+                self.recent_sessions.popitem(last=False)
+    
+    def recent_memory_texts(self, limit: int) -> List[str]:
+        """Newest memory of each of the most recently active users."""
+        with self.recent_lock:
+            recent = list(reversed(self.recent_sessions))
+        texts = []
+        seen_users = set()
+        for user_id, session_id in recent:
+            if len(texts) >= limit:
+                break
+            if user_id in seen_users:
+                continue
+            try:
+                # Same filtered, cached fetch the requests use.
+                memories = self.get_session_memories(user_id, session_id)
+            except Exception as e:
+                print(f"Error loading memories of {user_id}: {e}")
+                continue
+            seen_users.add(user_id)
+            memories = sorted(
+                memories,
+                key=lambda m: m.get("updated_at") or m.get("created_at") or "",
+                reverse=True,
+            )
+            if memories and memories[0].get("memory"):
+                texts.append(memories[0]["memory"])
+        return texts
+    
+    def fetch_session_memories(self, user_id: str, session_id: str) -> List[dict]:
+        """
+        Memories of one session, filtered by Mem0 on the server so the payload
+        does not grow with the user's whole history. Falls back to fetching
+        everything and filtering here if the filtered call fails.
+        """
+        if time.time() >= self.filters_disabled_until:
+            try:
+                result = self.memory_client.get_all(
+                    version="v2",
+                    filters={
+                        "AND": [
+                            {"user_id": user_id},
+                            {"metadata": {"session_id": session_id}},
+                        ]
+                    },
+                )
+                if isinstance(result, dict):
+                    result = result.get("results", [])
+                return result or []
+            except Exception as e:
+                print(f"Filtered memory fetch failed, filtering client-side: {e}")
+                self.filters_disabled_until = time.time() + MEMORY_FILTER_RETRY_AFTER
+
+        all_memories = self.memory_client.get_all(user_id=user_id) or []
+        return [
+            m for m in all_memories
+            if (m.get("metadata") or {}).get("session_id") == session_id
+        ]
+    
+    def get_session_memories(self, user_id: str, session_id: str) -> List[dict]:
+        key = (user_id, session_id)
+        cached = self.session_memories.get(key)
+        if cached is not None and time.time() - cached[0] < MEMORY_CACHE_TTL:
+            return cached[1]
+        memories = self.fetch_session_memories(user_id, session_id)
+        self.session_memories.put(key, (time.time(), memories))
+        return memories
+    
+    def relevant_memories(self, user_id: str, session_id: str, query: str) -> List[str]:
+        return select_memories(query, self.get_session_memories(user_id, session_id))
+    
+    async def load_conversation_context(self, user_id: str, session_id: str, query: str = "") -> dict:
+        """
+        Past memory for the prompts: only the session memories most relevant
+        to `query`, so Router and Aggregator prompts stay small as sessions age.
+        """
         try:
-            key = self.get_conversation_key(user_id, session_id)
-            
-            all_memories = self.memory_client.get_all(user_id=user_id)
+            self.mark_active(user_id, session_id)
+            messages = await self.get_current_messages(user_id, session_id)
             
-            if not all_memories:
-                self.conversation_messages[key] = []
-                return {"past_memory": "This is a fresh conversation", "messages": []}
-            
-            session_memories = [
-                m for m in all_memories 
-                if m.get("metadata", {}).get("session_id") == session_id
-            ]
-            
-            summaries = []
-            for mem in session_memories:
-                summaries.append(mem.get("memory", ""))
-            
-            if key not in self.conversation_messages:
-                self.conversation_messages[key] = []
+            summaries = await asyncio.to_thread(
+                self.relevant_memories, user_id, session_id, query
+            )
             
-            combined_context = "\n\n".join([
-                "Summarized memory:\n" + "\n".join(summaries)
-            ]) if summaries else "This is a fresh conversation"
+            if not summaries:
+                return {"past_memory": "This is a fresh conversation", "messages": messages}
             
-            return {"past_memory": combined_context, "messages": self.conversation_messages[key]}
+            return {
+                "past_memory": "Summarized memory:\n" + "\n".join(summaries),
+                "messages": messages,
+            }
             
         except Exception as e:
             print(f"Error loading conversation context: {e}")
-            key = self.get_conversation_key(user_id, session_id)
-            self.conversation_messages[key] = []
             return {"past_memory": "Error loading conversation context", "messages": []}
     
-    async def save_conversation_turn(self, user_id: str, session_id: str, 
-                                   user_message: str, ai_response: str):
-        try:
-            conversation_data = [
-                {"role": "user", "content": user_message},
-                {"role": "assistant", "content": ai_response}
-            ]
-            
-            result = self.memory_client.add(
-                conversation_data,
-                user_id=user_id,
-                metadata={"session_id": session_id}
-            )
-            print(f"Conversation saved to Mem0: {result}")
-            
-        except Exception as e:
-            print(f"Error saving conversation: {e}")
+    def write_messages(self, user_id: str, session_id: str, messages: List[dict]):
+        result = self.memory_client.add(
+            messages,
+            user_id=user_id,
+            metadata={"session_id": session_id}
+        )
+        print(f"Conversation saved to Mem0: {result}")
+    
+    def save_conversation_turn(self, user_id: str, session_id: str, 
+                               user_message: str, ai_response: str):
+        """Queue the turn for Mem0; the write happens after the response."""
+        conversation_data = [
+            {"role": "user", "content": user_message},
+            {"role": "assistant", "content": ai_response}
+        ]
+        self.writer.submit(user_id, session_id, conversation_data)
     
-    def add_to_growing_conversation(self, user_id: str, session_id: str, 
-                                   user_message: str, ai_response: str):
-        key = self.get_conversation_key(user_id, session_id)
-        
-        if key not in self.conversation_messages:
-            self.conversation_messages[key] = []
-        
-        self.conversation_messages[key].extend([
+    async def add_to_growing_conversation(self, user_id: str, session_id: str, 
+                                          user_message: str, ai_response: str):
+        await self.short_term.append(user_id, session_id, [
             HumanMessage(content=user_message),
             AIMessage(content=ai_response)
         ])
-        
-        if len(self.conversation_messages[key]) > 10:
-            self.conversation_messages[key] = self.conversation_messages[key][-10:]
     
-    def get_current_messages(self, user_id: str, session_id: str) -> List[BaseMessage]:
-        key = self.get_conversation_key(user_id, session_id)
-        return self.conversation_messages.get(key, [])
+    async def get_current_messages(self, user_id: str, session_id: str) -> List[BaseMessage]:
+        return await self.short_term.get(user_id, session_id)
+
+async def storage_sweeper():
+    """Periodically evict least recently used uploads and FAISS caches."""
+    while True:
+        try:
+            await asyncio.to_thread(storage_manager.sweep)
+        except Exception as e:
+            print(f"Error in storage sweep: {e}")
+        await asyncio.sleep(STORAGE_SWEEP_INTERVAL)
+
+async def news_prefetch_loop():
+    """Refresh the News caches for hot topics every NEWS_PREFETCH_INTERVAL."""
+    while True:
+        await asyncio.sleep(NEWS_PREFETCH_INTERVAL)
+        try:
+            await asyncio.to_thread(news_prefetcher.run_cycle)
+        except Exception as e:
+            print(f"Error in news prefetch: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global sqlite_checkpointer, graph, memory_client, memory_manager
+    global sqlite_checkpointer, graph, memory_client, memory_manager, news_prefetcher
+    global job_store, job_runner
     
+    startup_started = time.perf_counter()
     checkpointer_cm = AsyncSqliteSaver.from_conn_string(SQLITE_DB_PATH)
+    sweeper_task = None
+    warmup_task = None
+    prefetch_task = None
     try:
-        sqlite_checkpointer = await checkpointer_cm.__aenter__()
-        graph = BuildGraph(sqlite_checkpointer)
-        memory_client = MemoryClient()
+        with timed_phase("checkpointer"):
+            sqlite_checkpointer = await checkpointer_cm.__aenter__()
+        with timed_phase("build_graph"):
+            graph = BuildGraph(sqlite_checkpointer)
+        with timed_phase("memory_client"):
+            from mem0 import MemoryClient
+
+            memory_client = MemoryClient()
         memory_manager = ConversationMemoryManager(memory_client)  # Initialize here
-        os.makedirs("uploads", exist_ok=True)
+        memory_manager.writer.start()
+        job_store = JobStore()
+        # Job uploads stay until the job ends, on every worker's sweeper.
+        storage_manager.add_pin_source(job_store.active_files)
+        job_runner = JobRunner(job_store, run_job)
+        job_runner.start()
+        os.makedirs(UPLOADS_DIR, exist_ok=True)
+        sweeper_task = asyncio.create_task(storage_sweeper())
+        if NEWS_PREFETCH_ENABLED:
+            news_prefetcher = NewsPrefetcher(
+                memory_source=lambda: memory_manager.recent_memory_texts(
+                    NEWS_PREFETCH_MEMORY_TOPICS
+                )
+            )
+            prefetch_task = asyncio.create_task(news_prefetch_loop())
+        if WARMUP_ON_STARTUP:
+            warmup_task = asyncio.create_task(
+                asyncio.to_thread(warm_up, WARMUP_RESOURCES or None)
+            )
+        record_phase("lifespan", time.perf_counter() - startup_started)
+        print(f"Startup report: {startup_report()}")
         yield
     finally:
+        if prefetch_task:
+            prefetch_task.cancel()
+        if warmup_task:
+            warmup_task.cancel()
+        if sweeper_task:
+            sweeper_task.cancel()
+        if job_runner:
+            await job_runner.stop()
+        if memory_manager:
+            await memory_manager.writer.close(MEMORY_FLUSH_TIMEOUT)
         if sqlite_checkpointer:
             await checkpointer_cm.__aexit__(None, None, None)
 
 app = FastAPI(lifespan=lifespan)
 
+@app.middleware("http")
+async def stamp_arrival(request: Request, call_next):
+    """Remember when the request arrived, for its admission deadline."""
+    request.state.received_at = time.monotonic()
+    return await call_next(request)
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Reject oversized multipart bodies before they are read and spooled."""
+    if "multipart/form-data" in request.headers.get("content-type", ""):
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > MAX_REQUEST_UPLOAD_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Upload exceeds {MAX_REQUEST_UPLOAD_BYTES} bytes"},
+            )
+    return await call_next(request)
+
 # Remove the @app.on_event("startup") section entirely
 
 class MessageRequest(BaseModel):
@@ -129,56 +367,147 @@ class MessageRequest(BaseModel):
     session_id: str
     message: str
 
+class BatchRequest(BaseModel):
+    items: List[MessageRequest]
+    # Lower than BATCH_CONCURRENCY to go easier on rate-limited APIs.
+    concurrency: Optional[int] = None
+
 def generate_thread_id(user_id: str, session_id: str) -> str:
     return f"{user_id}-{session_id}"
 
-@app.post("/invoke")
-async def invoke_agent(request: MessageRequest):
-    thread_id = generate_thread_id(request.user_id, request.session_id)
-    config = {"configurable": {"thread_id": thread_id}}
-    
-    context = await memory_manager.load_conversation_context(
-        request.user_id, request.session_id
-    )
-    
-    current_messages = memory_manager.get_current_messages(
-        request.user_id, request.session_id
-    )
-    
-    initial_state: GraphState = {
-        "input": request.message,
-        "user_id": request.user_id,
-        "session_id": request.session_id,
-        "messages": current_messages,
-        "past_memory": context["past_memory"]
-    }
+invoke_admission = AdmissionController("invoke", ADMISSION_INVOKE_CONCURRENCY)
+files_admission = AdmissionController("invoke_with_files", ADMISSION_FILES_CONCURRENCY)
+batch_admission = AdmissionController(
+    "invoke_batch",
+    ADMISSION_BATCH_CONCURRENCY,
+    max_queue=0,
+    per_user=ADMISSION_BATCH_CONCURRENCY,
+)
 
+def client_deadline(request: Request) -> float:
+    """
+    When the client stops waiting for `request`, on the monotonic clock: its
+    X-Request-Timeout header (seconds) or ADMISSION_REQUEST_DEADLINE after
+    it arrived.
+    """
     try:
+        timeout = float(request.headers.get("x-request-timeout", ""))
+    except ValueError:
+        timeout = ADMISSION_REQUEST_DEADLINE
+    if timeout <= 0:
+        timeout = ADMISSION_REQUEST_DEADLINE
+    return getattr(request.state, "received_at", time.monotonic()) + timeout
+
+@asynccontextmanager
+async def admitted(
+    controller: AdmissionController, user_id: str, deadline: Optional[float] = None
+):
+    """Run inside the endpoint's concurrency limit, or fail fast with a 429."""
+    try:
+        async with controller.admit(user_id, deadline):
+            yield
+    except Rejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many requests: {e.reason}",
+            headers={"Retry-After": str(int(e.retry_after))},
+        )
+
+async def save_uploads(thread_id: str, files: List[UploadFile]) -> dict:
+    """Store uploaded files and return the GraphState fields describing them."""
+    uploads = {"uploaded_doc": "", "uploaded_doc_hash": "", "uploaded_imgs": []}
+    for file in files:
+        is_image = 'image' in (file.content_type or "")
+        try:
+            stored = await store_upload(file, MAX_IMAGE_BYTES if is_image else MAX_DOCUMENT_BYTES)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        await asyncio.to_thread(storage_manager.pin, thread_id, stored.path)
+
+        if is_image:
+            image_id = f"img-{len(uploads['uploaded_imgs']) + 1}"
+            uploads["uploaded_imgs"].append(
+                {"id": image_id, "name": file.filename or image_id, "path": stored.path}
+            )
+        else:
+            uploads["uploaded_doc"] = stored.path
+            uploads["uploaded_doc_hash"] = stored.digest
+    return uploads
+
+async def run_graph_turn(
+    user_id: str,
+    session_id: str,
+    message: str,
+    uploads: Optional[dict] = None,
+    admission: Optional[AsyncContextManager] = None,
+) -> str:
+    """
+    Run one conversation turn through the graph and record it in short- and
+    long-term memory; shared by the invoke endpoints and the job workers.
+    The session is locked for the whole turn (SessionBusy if it stays busy).
+    `admission` is entered only once the lock is held, so waiting behind
+    another turn of the session does not occupy a concurrency slot.
+    """
+    thread_id = generate_thread_id(user_id, session_id)
+    config = {"configurable": {"thread_id": thread_id}}
+    # Follow-ups reuse the session's earlier uploads from the checkpoint.
+    await asyncio.to_thread(storage_manager.refresh, thread_id)
+
+    async with (
+        memory_manager.short_term.session_lock(user_id, session_id),
+        admission or nullcontext(),
+    ):
+        context = await memory_manager.load_conversation_context(user_id, session_id, message)
+        current_messages = await memory_manager.get_current_messages(user_id, session_id)
+
+        initial_state: GraphState = {
+            "input": message,
+            "user_id": user_id,
+            "session_id": session_id,
+            "messages": current_messages,
+            "past_memory": context["past_memory"],
+            **(uploads or {}),
+        }
+
         final_state = None
         async for event in graph.astream(initial_state, config=config):
             if "Aggregator" in event:
                 final_state = event["Aggregator"]
 
         if not final_state or "final_response" not in final_state:
-            raise HTTPException(status_code=500, detail="Graph did not produce a final response.")
+            raise RuntimeError("Graph did not produce a final response.")
 
         ai_response = final_state["final_response"]
-        
-        memory_manager.add_to_growing_conversation(
-            request.user_id, request.session_id, request.message, ai_response
+
+        await memory_manager.add_to_growing_conversation(
+            user_id, session_id, message, ai_response
         )
-        
-        await memory_manager.save_conversation_turn(
-            request.user_id, request.session_id, request.message, ai_response
+
+        memory_manager.save_conversation_turn(
+            user_id, session_id, message, ai_response
         )
 
-        return {"response": ai_response}
-        
+        return ai_response
+
+@app.post("/invoke")
+async def invoke_agent(request: MessageRequest, http_request: Request):
+    admission = admitted(invoke_admission, request.user_id, client_deadline(http_request))
+    try:
+        ai_response = await run_graph_turn(
+            request.user_id, request.session_id, request.message, admission=admission
+        )
+    except HTTPException:
+        raise
+    except SessionBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Graph execution error: {e}")
 
+    return {"response": ai_response}
+
 @app.post("/invoke_with_files")
 async def invoke_agent_with_files(
+    http_request: Request,
     user_id: str = Form(...),
     session_id: str = Form(...),
     message: str = Form(...),
@@ -187,60 +516,256 @@ async def invoke_agent_with_files(
     if not files:
         raise HTTPException(status_code=400, detail="No files were provided.")
 
-    file_paths = {"uploaded_doc": "", "uploaded_img": ""}
-    
-    for file in files:
-        unique_filename = f"{uuid.uuid4()}-{file.filename}"
-        local_path = os.path.join("uploads", unique_filename)
-        with open(local_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+    uploads = await save_uploads(generate_thread_id(user_id, session_id), files)
+    admission = admitted(files_admission, user_id, client_deadline(http_request))
+    try:
+        ai_response = await run_graph_turn(
+            user_id, session_id, message, uploads, admission=admission
+        )
+    except HTTPException:
+        raise
+    except SessionBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Graph execution error with files: {e}")
 
-        if 'image' in (file.content_type or ""):
-            file_paths["uploaded_img"] = local_path
-        else:
-            file_paths["uploaded_doc"] = local_path
-    
-    thread_id = generate_thread_id(user_id, session_id)
-    config = {"configurable": {"thread_id": thread_id}}
-    
-    context = await memory_manager.load_conversation_context(user_id, session_id)
-    current_messages = memory_manager.get_current_messages(user_id, session_id)
-
-    initial_state: GraphState = {
-        "input": message,
-        "user_id": user_id,
-        "session_id": session_id,
-        "uploaded_doc": file_paths.get("uploaded_doc"),
-        "uploaded_img": file_paths.get("uploaded_img"),
-        "messages": current_messages,
-        "past_memory": context["past_memory"]
-    }
+    return {"response": ai_response}
 
+async def run_batch(items: List[MessageRequest], concurrency: int) -> AsyncIterator[dict]:
+    """
+    Run batch items through the graph, `concurrency` at a time, and yield
+    each result as soon as it is ready. Items of one session run in their
+    given order, so follow-ups see the earlier answers and never contend
+    for the session lock; all items share this worker's indexes and caches.
+    """
+    sessions: "OrderedDict[str, list]" = OrderedDict()
+    for index, item in enumerate(items):
+        thread_id = generate_thread_id(item.user_id, item.session_id)
+        sessions.setdefault(thread_id, []).append((index, item))
+
+    slots = asyncio.Semaphore(concurrency)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def run_session(session_items: list) -> None:
+        for index, item in session_items:
+            result = {"index": index, "user_id": item.user_id, "session_id": item.session_id}
+            async with slots:
+                try:
+                    result["response"] = await run_graph_turn(
+                        item.user_id, item.session_id, item.message
+                    )
+                    result["status"] = "ok"
+                except Exception as e:
+                    result.update(status="error", error=str(e))
+            await results.put(result)
+
+    tasks = [asyncio.create_task(run_session(s)) for s in sessions.values()]
     try:
-        final_state = None
-        async for event in graph.astream(initial_state, config=config):
-            if "Aggregator" in event:
-                final_state = event["Aggregator"]
+        for _ in range(len(items)):
+            yield await results.get()
+    finally:
+        # Client went away: stop the remaining items.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
-        if not final_state or "final_response" not in final_state:
-            raise HTTPException(status_code=500, detail="Graph did not produce a final response.")
+@app.post("/invoke_batch")
+async def invoke_batch(request: BatchRequest):
+    """
+    Answer many messages in one call. Results stream back as NDJSON, one
+    line per item in completion order (with its `index`), then a summary.
+    Documents are uploaded beforehand via /invoke_with_files; later items
+    in the same session reuse them.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="No items were provided.")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch."
+        )
+    concurrency = max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY))
 
-        ai_response = final_state["final_response"]
-        
-        memory_manager.add_to_growing_conversation(
-            user_id, session_id, message, ai_response
+    # Admitted before the response starts, so a refusal is still a plain 429.
+    admission = AsyncExitStack()
+    await admission.enter_async_context(admitted(batch_admission, "batch"))
+
+    async def stream():
+        succeeded = 0
+        async with admission, aclosing(run_batch(request.items, concurrency)) as results:
+            async for result in results:
+                succeeded += result["status"] == "ok"
+                yield json.dumps(result) + "\n"
+        summary = {"done": True, "succeeded": succeeded, "failed": len(request.items) - succeeded}
+        yield json.dumps(summary) + "\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson",
+        # Releases the slot if the stream never started; no-op otherwise.
+        background=BackgroundTask(admission.aclose),
+    )
+
+async def run_job(job: dict) -> dict:
+    payload = job["payload"]
+    try:
+        response = await run_graph_turn(
+            job["user_id"], job["session_id"], payload["message"], payload.get("uploads")
         )
-        
-        await memory_manager.save_conversation_turn(
-            user_id, session_id, message, ai_response
+    except SessionBusy as e:
+        # An interactive turn of the session is running; try again later.
+        raise RetryLater(str(e))
+    return {"response": response}
+
+def job_view(job: dict) -> dict:
+    view = {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+    if job["status"] == SUCCEEDED:
+        view["result"] = job["result"]
+    elif job["status"] == FAILED:
+        view["error"] = job["error"]
+    return view
+
+async def enqueue_job(
+    kind: str, user_id: str, session_id: str, payload: dict, files: List[str] = ()
+) -> dict:
+    pending = await asyncio.to_thread(job_store.pending_for_user, user_id)
+    if pending >= JOB_MAX_PENDING_PER_USER:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many pending jobs ({pending}) for this user",
+            headers={"Retry-After": "60"},
         )
+    job_id = await asyncio.to_thread(
+        job_store.create, kind, user_id, session_id, payload, files
+    )
+    job_runner.notify()
+    return {"job_id": job_id, "status": QUEUED, "status_url": f"/jobs/{job_id}"}
 
-        return {"response": ai_response}
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Graph execution error with files: {e}")
+@app.post("/jobs", status_code=202)
+async def submit_job(request: MessageRequest):
+    """Same payload as /invoke; returns a job id to poll instead of the answer."""
+    return await enqueue_job(
+        "invoke", request.user_id, request.session_id, {"message": request.message}
+    )
+
+@app.post("/jobs/with_files", status_code=202)
+async def submit_job_with_files(
+    user_id: str = Form(...),
+    session_id: str = Form(...),
+    message: str = Form(...),
+    files: List[UploadFile] = File(...)
+):
+    """Same payload as /invoke_with_files; the files are stored before queueing."""
+    if not files:
+        raise HTTPException(status_code=400, detail="No files were provided.")
+    uploads = await save_uploads(generate_thread_id(user_id, session_id), files)
+    paths = [img["path"] for img in uploads["uploaded_imgs"]]
+    if uploads["uploaded_doc"]:
+        paths.append(uploads["uploaded_doc"])
+    return await enqueue_job(
+        "invoke_with_files",
+        user_id,
+        session_id,
+        {"message": message, "uploads": uploads},
+        paths,
+    )
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job.")
+    return job_view(job)
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job.")
+    if job["status"] == SUCCEEDED:
+        return job["result"]
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=500, detail=f"Job failed: {job['error']}")
+    return JSONResponse(
+        status_code=202,
+        content=job_view(job),
+        headers={"Retry-After": str(max(1, int(JOB_POLL_INTERVAL)))},
+    )
+
+@app.get("/admin/storage")
+async def storage_stats():
+    return await asyncio.to_thread(storage_manager.stats)
+
+@app.get("/admin/caches")
+async def caches_stats():
+    return cache_stats()
+
+@app.get("/admin/news")
+async def news_stats():
+    return {
+        "extraction_pool": extraction_pool.stats(),
+        "cache": await asyncio.to_thread(news_cache.get().stats) if news_cache.loaded else None,
+        "prefetch": news_prefetcher.last_cycle if news_prefetcher else None,
+    }
+
+@app.get("/admin/admission")
+async def admission_stats():
+    controllers = (invoke_admission, files_admission, batch_admission)
+    return {c.name: c.stats() for c in controllers}
+
+@app.get("/admin/jobs")
+async def jobs_stats():
+    return await asyncio.to_thread(job_runner.stats) if job_runner else None
+
+@app.get("/admin/memory")
+async def memory_stats():
+    if not memory_manager:
+        return {"write_queue": None, "short_term": None}
+    return {
+        "write_queue": memory_manager.writer.stats(),
+        "short_term": await asyncio.to_thread(memory_manager.short_term.stats),
+    }
+
+@app.get("/admin/process")
+async def process_stats():
+    """This worker's memory, and the USS of every worker forked alongside it."""
+    return {
+        "worker": process_memory(),
+        **await asyncio.to_thread(worker_memory_report),
+    }
+
+@app.get("/admin/ocr")
+async def ocr_stats():
+    return {"preprocessing": prep_stats()}
+
+@app.get("/admin/startup")
+async def startup_stats():
+    return startup_report()
 
 if __name__ == "__main__":
-    import uvicorn
     port = int(os.getenv("PORT", 8080))
-    uvicorn.run("Main:app", host="0.0.0.0", port=port, reload=True)  # Updated module name
+    # Conversation state is shared through CONVERSATION_BACKEND, so several
+    # workers are safe. The reloader only supports a single process.
+    reload = os.getenv("UVICORN_RELOAD", "false").lower() == "true"
+    if not reload:
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            print("gunicorn is not available, serving with uvicorn workers")
+        else:
+            # Pre-fork launcher: see gunicorn.conf.py.
+            app_dir = os.path.dirname(os.path.abspath(__file__))
+            config = os.path.join(app_dir, "gunicorn.conf.py")
+            os.execvp(
+                "gunicorn", ["gunicorn", "--chdir", app_dir, "-c", config, "Main:app"]
+            )
+
+    import uvicorn
+    workers = 1 if reload else int(os.getenv("WEB_CONCURRENCY", default_web_concurrency()))
+    uvicorn.run("Main:app", host="0.0.0.0", port=port, reload=reload, workers=workers)
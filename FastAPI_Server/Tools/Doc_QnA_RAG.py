@@ -172,20 +172,26 @@ import os
 import time
 from langchain.tools import tool
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing import List, Union
+from typing import Dict, List, Optional, Tuple, Union
 from langchain_core.messages import AIMessage, HumanMessage, BaseMessage, SystemMessage
 
-# from langchain_huggingface import HuggingFaceEndpointEmbeddings
-from langchain_huggingface import HuggingFaceEmbeddings
-import sentence_transformers
 from langchain_community.vectorstores import FAISS
-from langchain.chains import RetrievalQA
 from langchain_core.prompts import PromptTemplate
 
 # from langchain_core.runnables import RunnableParallel, RunnablePassthrough
-from langchain_google_genai import ChatGoogleGenerativeAI
-from unstract.llmwhisperer import LLMWhispererClientV2
-import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from Tools.pdf_extract import extract_pdf_text, is_pdf
+from Tools.index_store import SQLiteDocstore, is_index_dir, load_index, save_index
+from Tools.storage import FAISS_CACHE_DIR, storage_manager
+from Tools.embeddings import embed_query, embeddings_model
+from Tools.cache import LRUCache
+from Tools.lazy import LazyResource
+from Tools.uploads import file_digest
 
 
 # Environment setup
@@ -195,31 +201,37 @@ load_dotenv()
 
 
 def get_file_hash(file_path: str) -> str:
-    """Compute MD5 hash of the file content."""
-    hasher = hashlib.md5()
-    with open(file_path, "rb") as f:
-        while chunk := f.read(8192):
-            hasher.update(chunk)
-    return hasher.hexdigest()
-
+    """Content hash of the file (BLAKE2b, the digest uploads are stored under)."""
+    return file_digest(file_path)
 
-embeddings_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/static-retrieval-mrl-en-v1"
-)
 
 text_splitter = RecursiveCharacterTextSplitter(chunk_size=900, chunk_overlap=200)
 
 
-model = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash", temperature=0, google_api_key=os.getenv("GOOGLE_API_KEY")
-)
+def _load_model():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.0-flash",
+        temperature=0,
+        google_api_key=os.getenv("GOOGLE_API_KEY"),
+    )
+
+
+model = LazyResource("doc_qna_llm", _load_model)
 
 
 # LLM Whisperer client setup
-llm_whisperer = LLMWhispererClientV2(
-    base_url="https://llmwhisperer-api.us-central.unstract.com/api/v2",
-    api_key=os.getenv("LLM_WHISPERER_API_KEY"),
-)
+def _load_llm_whisperer():
+    from unstract.llmwhisperer import LLMWhispererClientV2
+
+    return LLMWhispererClientV2(
+        base_url="https://llmwhisperer-api.us-central.unstract.com/api/v2",
+        api_key=os.getenv("LLM_WHISPERER_API_KEY"),
+    )
+
+
+llm_whisperer = LazyResource("llm_whisperer", _load_llm_whisperer)
 
 prompt = PromptTemplate(
     input_variables=["context", "question"],
@@ -245,41 +257,134 @@ Answer:
 )
 
 
-def pdf_to_text(file_path: str) -> str:
-    """Extract text from PDF using LLM Whisperer"""
-    result = llm_whisperer.whisper(file_path=file_path)
+LLMWHISPERER_POLL_INTERVAL = float(os.getenv("LLMWHISPERER_POLL_INTERVAL", 2))
+PAGE_SEPARATOR = "<<<"
+
+
+def whisper_text(file_path: str, pages_to_extract: str = "") -> str:
+    """Extract text using LLM Whisperer, optionally only for some pages ("1,4,7")."""
+    client = llm_whisperer.get()
+    result = client.whisper(
+        file_path=file_path,
+        pages_to_extract=pages_to_extract,
+        page_seperator=PAGE_SEPARATOR,
+    )
 
     while True:
-        status = llm_whisperer.whisper_status(whisper_hash=result["whisper_hash"])
+        status = client.whisper_status(whisper_hash=result["whisper_hash"])
         if status["status"] == "processed":
-            result = llm_whisperer.whisper_retrieve(whisper_hash=result["whisper_hash"])
+            result = client.whisper_retrieve(whisper_hash=result["whisper_hash"])
             return result["extraction"]["result_text"]
-        time.sleep(5)
+        time.sleep(LLMWHISPERER_POLL_INTERVAL)
+
+
+def whisper_pages(file_path: str, page_numbers: List[int]) -> Dict[int, str]:
+    """OCR backend for extract_pdf_text that sends only the given pages."""
+    text = whisper_text(
+        file_path, pages_to_extract=",".join(str(p + 1) for p in page_numbers)
+    )
+    # Empty parts are kept (blank pages) so parts line up with page numbers;
+    # only a trailing separator's empty tail is dropped.
+    parts = [part.strip("\f\n ") for part in text.split(PAGE_SEPARATOR)]
+    if len(parts) == len(page_numbers) + 1 and not parts[-1]:
+        parts.pop()
+    if len(parts) != len(page_numbers):
+        print(
+            f"OCR returned {len(parts)} pages for {len(page_numbers)} requested; "
+            "keeping its text in one piece"
+        )
+        return {page_numbers[0]: text}
+    return dict(zip(page_numbers, parts))
 
 
-rag_chain = None
+def pdf_to_text(file_path: str) -> str:
+    """Extract text from PDF, reading the text layer locally where possible"""
+    try:
+        if is_pdf(file_path):
+            return extract_pdf_text(file_path, ocr=whisper_pages)
+    except Exception as e:
+        # Only an unreadable text layer sends the whole file; OCR failures on
+        # single pages are handled by extract_pdf_text.
+        print(f"Could not read the PDF text layer: {e}. Falling back to LLM Whisperer...")
+    return whisper_text(file_path)
 
-vector_store = None
 
-CACHE_DIR = "./faiss_cache"
+CACHE_DIR = FAISS_CACHE_DIR
 os.makedirs(CACHE_DIR, exist_ok=True)
 
+# Opened indexes are memory-mapped, so keeping a handful of them around per
+# process is cheap and saves re-opening the same document on every question.
+OPEN_INDEX_CACHE_SIZE = int(os.getenv("OPEN_INDEX_CACHE_SIZE", 16))
+_open_stores: "OrderedDict[str, FAISS]" = OrderedDict()
+_open_stores_lock = threading.Lock()
 
-def setup_rag_system(file_path: str):
-    """Process PDF and create FAISS vector store"""
-    global vector_store
 
-    file_hash = get_file_hash(file_path)
+def _remember_store(file_hash: str, store: FAISS) -> None:
+    with _open_stores_lock:
+        _open_stores[file_hash] = store
+        _open_stores.move_to_end(file_hash)
+        # Evicted stores are not closed here: a request may still be searching
+        # one, and its SQLite connection closes once the last user drops it.
+        while len(_open_stores) > OPEN_INDEX_CACHE_SIZE:
+            _open_stores.popitem(last=False)
+
+
+# Per-document build locks with the number of threads using each; an entry
+# is dropped when its last user is done, so the dict only holds builds in
+# progress.
+_build_locks: Dict[str, list] = {}
+
+
+def _open_store(file_hash: str, cache_path: str):
+    with _open_stores_lock:
+        store = _open_stores.get(file_hash)
+        if store is not None and not is_index_dir(cache_path):
+            # Evicted from disk by the storage manager; rebuild it.
+            _open_stores.pop(file_hash)
+            store = None
+        if store is not None:
+            _open_stores.move_to_end(file_hash)
+            storage_manager.touch(cache_path)
+        return store
+
+
+def setup_rag_system(file_path: str, file_hash: str = None):
+    """Process PDF and create FAISS vector store"""
+    file_hash = file_hash or get_file_hash(file_path)
     cache_path = os.path.join(CACHE_DIR, file_hash)
+    storage_manager.register_derived(file_path, cache_path)
+
+    store = _open_store(file_hash, cache_path)
+    if store is not None:
+        return store
 
+    # Questions arriving together about a new document (e.g. a batch) wait
+    # for a single load or build instead of each doing their own.
+    with _open_stores_lock:
+        entry = _build_locks.setdefault(file_hash, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            store = _open_store(file_hash, cache_path)
+            if store is not None:
+                return store
+            return _load_or_build(file_path, file_hash, cache_path)
+    finally:
+        with _open_stores_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _build_locks[file_hash]
+
+
+def _load_or_build(file_path: str, file_hash: str, cache_path: str):
     # Try loading cached FAISS index
-    if os.path.exists(cache_path):
+    if is_index_dir(cache_path):
         try:
             print(f"Loading cached FAISS index for file hash {file_hash}...")
-            vector_store = FAISS.load_local(
-                cache_path, embeddings_model, allow_dangerous_deserialization=True
-            )
+            vector_store = load_index(cache_path, embeddings_model.get())
+            storage_manager.touch(cache_path)
             print("Loaded cached vector store successfully.")
+            _remember_store(file_hash, vector_store)
             return vector_store
         except Exception as e:
             print(f"Failed to load cache: {e}. Reprocessing...")
@@ -296,24 +401,100 @@ def setup_rag_system(file_path: str):
         {"source": os.path.basename(file_path), "file_hash": file_hash} for _ in chunks
     ]
 
-    # Create FAISS index
-    vector_store = FAISS.from_texts(texts=chunks, embedding=embeddings_model)
-    vector_store.save_local(cache_path)
+    # Create FAISS index, persist it in the mmap-able format and serve
+    # questions from the memory-mapped copy like every other worker does.
+    in_memory_store = FAISS.from_texts(
+        texts=chunks, embedding=embeddings_model.get(), metadatas=metadatas
+    )
+    save_index(in_memory_store, cache_path)
     print(f"Saved FAISS index cache at {cache_path}")
+    # Chunk ids of a rebuilt index need not match the old ones.
+    retrieval_cache.discard_where(lambda key: key[0] == file_hash)
 
+    vector_store = load_index(cache_path, embeddings_model.get())
+    _remember_store(file_hash, vector_store)
     return vector_store
 
 
+# Near-duplicate questions about the same document reuse the search hits of
+# an earlier one: a query whose normalized embedding has a cosine similarity
+# of at least RETRIEVAL_SIMILARITY with one of the last
+# RETRIEVAL_RECENT_QUERIES queries on that document (and mentions the same
+# numbers, so "revenue in 2023" never answers "revenue in 2024") gets its
+# chunk ids. The cache is per process: every gunicorn worker keeps its own,
+# and a document's entries are only dropped when this process rebuilds its
+# index (or by LRU eviction).
+RETRIEVAL_K = 20
+RETRIEVAL_SIMILARITY = float(os.getenv("RETRIEVAL_SIMILARITY", 0.97))
+RETRIEVAL_RECENT_QUERIES = int(os.getenv("RETRIEVAL_RECENT_QUERIES", 64))
+# Entries are keyed (file_hash, k) and hold (unit query vectors, their
+# numbers, their chunk ids), newest last.
+retrieval_cache = LRUCache(
+    "retrieval_results",
+    max_bytes=int(os.getenv("RETRIEVAL_CACHE_BYTES", 8 * 1024 * 1024)),
+)
+
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def query_numbers(query: str) -> Tuple[str, ...]:
+    return tuple(sorted(set(_NUMBER_RE.findall(query))))
+
+
+def _similar_hits(entry, unit: np.ndarray, numbers: Tuple[str, ...]) -> Optional[List[str]]:
+    vectors, entry_numbers, hits = entry
+    similarity = vectors @ unit
+    for i in np.argsort(-similarity):
+        if similarity[i] < RETRIEVAL_SIMILARITY:
+            break
+        if entry_numbers[i] == numbers:
+            return hits[i]
+    return None
+
+
+def retrieve_chunks(vector_store: FAISS, file_hash: str, query: str, k: int = RETRIEVAL_K):
+    """Similarity search for `query`, reusing hits of near-duplicate queries."""
+    vector = embed_query(query)
+    unit = (vector / (np.linalg.norm(vector) or 1.0)).astype(np.float32)
+    numbers = query_numbers(query)
+    key = (file_hash, k)
+
+    entry = retrieval_cache.get(key)
+    chunk_ids = _similar_hits(entry, unit, numbers) if entry is not None else None
+    if chunk_ids is None:
+        _, positions = vector_store.index.search(vector.reshape(1, -1), k)
+        chunk_ids = [
+            vector_store.index_to_docstore_id[int(i)] for i in positions[0] if i != -1
+        ]
+        vectors, entry_numbers, hits = entry or (np.empty((0, unit.size), np.float32), [], [])
+        start = max(0, len(hits) + 1 - RETRIEVAL_RECENT_QUERIES)
+        retrieval_cache.put(
+            key,
+            (
+                np.vstack([vectors[start:], unit]),
+                entry_numbers[start:] + [numbers],
+                hits[start:] + [chunk_ids],
+            ),
+        )
+
+    docstore = vector_store.docstore
+    if isinstance(docstore, SQLiteDocstore):
+        return docstore.search_many(chunk_ids)
+    return [docstore.search(chunk_id) for chunk_id in chunk_ids]
+
+
 @tool
 def rag_qa_tool(
     file_path: str,
     query: str,
     dependency_context: str = "",
     message_history: List[Union[AIMessage, HumanMessage]] = [],
+    file_hash: str = "",
 ) -> str:
     """
     Query the processed document using the FAISS-based RAG system with full context.
     Accepts dependency context and prior message history to enable multi-agent reasoning.
+    `file_hash` is the content hash computed at upload time, if known.
     """
 
     print(f"Original Query: {query}")
@@ -363,21 +544,16 @@ def rag_qa_tool(
             HumanMessage(content=full_input),
         ]
 
-        refined_query = model.invoke(query_parsing_messages).content.strip()
+        refined_query = model.get().invoke(query_parsing_messages).content.strip()
         print(f"\nRefined query: {refined_query}")
 
-        vector_store = setup_rag_system(file_path=file_path)
+        file_hash = file_hash or get_file_hash(file_path)
+        vector_store = setup_rag_system(file_path=file_path, file_hash=file_hash)
 
         if not vector_store:
             return "Document processing failed. Please upload a valid document."
 
-        rag_chain = RetrievalQA.from_chain_type(
-            llm=model,
-            retriever=vector_store.as_retriever(search_kwargs={"k": 20}),
-            chain_type="stuff",
-            return_source_documents=True,
-            chain_type_kwargs={"prompt": prompt},
-        )
+        docs = retrieve_chunks(vector_store, file_hash, refined_query)
 
         context_aware_query = f"""Refined Question: {refined_query}
             Original Query: {query}
@@ -386,8 +562,12 @@ def rag_qa_tool(
             Please provide a detailed 150-word maximum answer using document information only. Include dates, metrics, and be precise.
 """
 
-        result = rag_chain.invoke({"query": context_aware_query})
-        return result["result"]
+        # Same "stuff" prompt RetrievalQA used: chunks joined by blank lines.
+        context = "\n\n".join(doc.page_content for doc in docs)
+        result = model.get().invoke(
+            prompt.format(context=context, question=context_aware_query)
+        )
+        return result.content
 
     except Exception as e:
         return f"[ERROR] RAG query processing failed: {str(e)}"
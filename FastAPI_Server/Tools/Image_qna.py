@@ -78,47 +78,181 @@
 
 
 
-import boto3
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.tools import tool
 from langchain_core.messages import HumanMessage, SystemMessage,AIMessage,BaseMessage
-import pprint
-from typing import List, Union
+from typing import Dict, List, Optional, Union
+from Tools.lazy import LazyResource
+from Tools.ocr_backend import load_ocr_engine
+from Tools.ocr_cache import OCRCache, content_hash
+from Tools.ocr_structure import format_blocks, needs_structure
+from Tools.image_prep import (
+    OCR_JPEG_QUALITY,
+    OCR_MAX_DIMENSION,
+    OCR_PASSTHROUGH_BYTES,
+    submit_preprocess,
+)
 
 
 load_dotenv()
 
-textract = boto3.client("textract", region_name="us-east-1")
+# Upper bound on concurrent OCR calls across all requests in a worker.
+OCR_MAX_CONCURRENCY = int(os.getenv("OCR_MAX_CONCURRENCY", 4))
+_ocr_executor = ThreadPoolExecutor(max_workers=OCR_MAX_CONCURRENCY, thread_name_prefix="ocr")
+
+
+def _load_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.0-flash", temperature=0, google_api_key=os.getenv("GOOGLE_API_KEY")
+    )
+
+
+ocr_engine = LazyResource("ocr_engine", load_ocr_engine)
+llm = LazyResource("image_qna_llm", _load_llm)
+ocr_cache = LazyResource("ocr_cache", OCRCache)
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash", temperature=0, google_api_key=os.getenv("GOOGLE_API_KEY")
-)
+
+def image_digest(data: bytes) -> str:
+    """
+    OCR cache key of an upload: its raw bytes together with the settings
+    that shape the preprocessed pages and the engine that reads them, so a
+    cache hit needs no Pillow work at all.
+    """
+    return content_hash(
+        data,
+        f"max-dimension={OCR_MAX_DIMENSION}",
+        f"jpeg-quality={OCR_JPEG_QUALITY}",
+        f"passthrough-bytes={OCR_PASSTHROUGH_BYTES}",
+        f"engine={ocr_engine.get().name}",
+    )
+
+
+def cached_ocr(digest: str, structured: bool) -> Optional[List[List[dict]]]:
+    """OCR blocks of every page of an image from an earlier question, if any."""
+    cache = ocr_cache.get()
+    # An earlier forms/tables analysis also answers plain-text questions.
+    pages = cache.get(f"{digest}-forms-tables")
+    if pages is None and not structured:
+        pages = cache.get(f"{digest}-text")
+    return pages
+
+
+def run_ocr(file_bytes: bytes, structured: bool) -> List[dict]:
+    """
+    OCR blocks for one page: plain text detection, or FORMS/TABLES
+    analysis when `structured`.
+    """
+    engine = ocr_engine.get()
+    if structured and engine.supports_structure:
+        return engine.analyze_document(file_bytes)
+    return engine.detect_text(file_bytes)
+
+
+def _read_image(path: str) -> bytes:
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def _submit_image(path: str) -> dict:
+    """
+    Read an upload and, unless an earlier question already OCRed it, start
+    preprocessing it in the background.
+    """
+    try:
+        data = _read_image(path)
+    except OSError as e:
+        return {"error": e}
+    digest = image_digest(data)
+    cached = cached_ocr(digest, structured=False) is not None
+    return {
+        "data": data,
+        "digest": digest,
+        "prep": None if cached else submit_preprocess(data),
+    }
+
+
+def extract_images_text(prepared: Dict[str, dict], structured: bool) -> Dict[str, str]:
+    """
+    OCR every page of every prepared image on the shared bounded pool and
+    return the text per image id, pages labelled when there are several.
+    Follow-up questions about the same image reuse the cached result.
+    """
+    structured = structured and ocr_engine.get().supports_structure
+    kind = "forms-tables" if structured else "text"
+    results = {}
+    jobs = {}
+    texts = {}
+    for image_id, image in prepared.items():
+        if "error" in image:
+            print(f"Could not read image {image_id}: {image['error']}")
+            texts[image_id] = f"[image could not be read: {image['error']}]"
+            continue
+        cached = cached_ocr(image["digest"], structured)
+        if cached is not None:
+            print(f"OCR cache hit for {image['digest']}")
+            results[image_id] = cached
+            continue
+        try:
+            # A text-only hit skipped preprocessing; a layout question needs it after all.
+            pages, _ = (image["prep"] or submit_preprocess(image["data"])).result()
+        except Exception as e:
+            # A corrupt or non-image upload only fails its own section.
+            print(f"Could not read image {image_id}: {e}")
+            texts[image_id] = f"[image could not be read: {e}]"
+            continue
+        jobs[image_id] = [
+            _ocr_executor.submit(run_ocr, page_bytes, structured) for page_bytes in pages
+        ]
+
+    for image_id, page_jobs in jobs.items():
+        page_blocks = []
+        for number, job in enumerate(page_jobs, start=1):
+            try:
+                page_blocks.append(job.result())
+            except Exception as e:
+                print(f"OCR failed for {image_id} page {number}: {e}")
+                page_blocks.append(None)
+        if all(blocks is not None for blocks in page_blocks):
+            ocr_cache.get().put(f"{prepared[image_id]['digest']}-{kind}", page_blocks)
+        results[image_id] = page_blocks
+
+    for image_id, page_blocks in results.items():
+        page_texts = []
+        for number, blocks in enumerate(page_blocks, start=1):
+            if blocks is None:
+                text = "[text could not be extracted]"
+            else:
+                text = format_blocks(blocks, structured)
+            page_texts.append(text if len(page_blocks) == 1 else f"--- Page {number} ---\n{text}")
+        texts[image_id] = "\n\n".join(page_texts)
+    return texts
 
 
 @tool
-def image_qna(uploaded_file, query: str,dependency_context: str = "",
+def image_qna(uploaded_images: Union[str, List[Dict[str, str]]], query: str,dependency_context: str = "",
     message_history: List[Union[AIMessage, HumanMessage]] = [],):
     """
-    Use this tool to answer questions from the uploaded image.
+    Use this tool to answer questions from the uploaded images.
+    `uploaded_images` is a list of {"id", "name", "path"} dicts (or a single path).
     The query may contain context from previous agent interactions concatenated with the main question and the previous conversation history .
     """
 
-    if isinstance(uploaded_file, str):
-        with open(uploaded_file, "rb") as file:
-            file_bytes = file.read()
-    else:
-        file_bytes = uploaded_file.read()
-
-    response = textract.analyze_document(
-        Document={"Bytes": file_bytes}, FeatureTypes=["FORMS", "TABLES"]
-    )
-    extracted_text = ""
-    for block in response["Blocks"]:
-        if block["BlockType"] == "LINE":
-            extracted_text += block["Text"] + "\n"
+    if isinstance(uploaded_images, str):
+        uploaded_images = [
+            {"id": "img-1", "name": os.path.basename(uploaded_images), "path": uploaded_images}
+        ]
+    if not uploaded_images:
+        return "No image was uploaded."
 
+    # Read every image and, unless an earlier question already OCRed it,
+    # downscale/recompress it while the question is being refined.
+    prepared = {
+        img["id"]: _submit_image(img["path"]) for img in uploaded_images
+    }
 
     def format_history(history: List[BaseMessage]) -> str:
         """Format message history into a string for model input."""
@@ -165,9 +299,20 @@ def image_qna(uploaded_file, query: str,dependency_context: str = "",
         HumanMessage(content=question)
     ]
 
-    refined_query = llm.invoke(query_parsing_messages).content.strip()
+    refined_query = llm.get().invoke(query_parsing_messages).content.strip()
     print(f"Refined query: {refined_query}")
 
+    # Only pay for forms/tables analysis when the question is about layout.
+    structured = needs_structure(query, refined_query) and ocr_engine.get().supports_structure
+    texts = extract_images_text(prepared, structured)
+    if len(uploaded_images) == 1:
+        extracted_text = texts[uploaded_images[0]["id"]]
+    else:
+        extracted_text = "\n\n".join(
+            f"=== Image {img['id']} ({img['name']}) ===\n{texts[img['id']]}"
+            for img in uploaded_images
+        )
+
     # Step 2: Analyze the document with context-aware system prompt
     system_prompt = """You are a financial document analysis tool being used by an agent system. You will be given extracted text from a financial document image and a question to answer.
 
@@ -185,13 +330,14 @@ def image_qna(uploaded_file, query: str,dependency_context: str = "",
     4. Include specific numbers, dates, and financial metrics when relevant
     5. If the question includes context from previous analysis, incorporate that understanding
     6. Be precise and professional in your analysis
+    7. When text from several images is given, each is headed with its image ID; answer across all of them and say which image a figure comes from
 
     Focus on providing actionable financial insights."""
 
     user_prompt = f"Original Input: {query}\nRefined Question: {refined_query}\n\nExtracted Document Text:\n{extracted_text}"
 
     messages = [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)]
-    response = llm.invoke(messages)
+    response = llm.get().invoke(messages)
 
     return response.content
 
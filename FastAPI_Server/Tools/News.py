@@ -1,15 +1,177 @@
 import os
 from langchain_core.tools import tool
 from langchain_core.messages import SystemMessage, HumanMessage,AIMessage,BaseMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
-from tavily import TavilyClient
 from dotenv import load_dotenv
-from pprint import pprint
-import trafilatura
-from typing import List, Union
+from typing import Dict, List, Union
+from Tools.lazy import LazyResource
+from Tools.http_fetch import article_fetcher
+from Tools.news_cache import NewsCache
+from Tools.extract_pool import extraction_pool
+from Tools.passages import select_passages
 load_dotenv()
 
-tavily_client = TavilyClient(api_key=os.environ["TAVILY_API_KEY"])
+# Search a few more results than needed and keep the first articles that
+# arrive, so one slow publisher does not hold up the answer.
+NEWS_SEARCH_RESULTS = int(os.getenv("NEWS_SEARCH_RESULTS", 5))
+NEWS_ARTICLES_WANTED = int(os.getenv("NEWS_ARTICLES_WANTED", 3))
+
+NEWS_TIME_RANGE = "month"
+NEWS_INCLUDE_DOMAINS = [
+    "financialexpress.com",
+    "economictimes.indiatimes.com",
+    "livemint.com",
+    "thehindu.com",
+    "wionews.com",
+    "moneycontrol.com",
+    "business-standard.com",
+    "reuters.com",
+    "bloomberg.com"
+]
+NEWS_EXCLUDE_DOMAINS = [
+    "reddit.com",
+    "twitter.com",
+    "facebook.com",
+    "X.com",
+    "instagram.com",
+    "youtube.com"
+]
+
+
+def _load_tavily_client():
+    from tavily import TavilyClient
+
+    return TavilyClient(api_key=os.environ["TAVILY_API_KEY"])
+
+
+def _load_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0, google_api_key=os.getenv("GOOGLE_API_KEY"))
+
+
+tavily_client = LazyResource("tavily_client", _load_tavily_client)
+news_llm = LazyResource("news_llm", _load_llm)
+news_cache = LazyResource("news_cache", NewsCache)
+
+
+QUERY_FORMULATION_PROMPT = """
+You are an expert financial research assistant. Your task is to analyze the given input (which may contain both a query , context from previous tools ,prevoious conversation history) and generate an optimized search query for financial news.
+
+The input may be in formats like:
+- "what is the current price of solana?"
+- "sector analysis based on: [previous document analysis about semiconductor industry]"
+- "market trends context: renewable energy consolidation analysis from previous step"
+
+                                                 
+
+Guidelines:
+1. Parse the input to identify the core query and any contextual information
+2. Extract key financial entities, companies, sectors, or concepts
+3. Identify the most relevant financial aspects (earnings, market trends, regulatory changes, etc.)
+4. Focus on recent developments and market-moving events
+5. Use specific financial terminology that would appear in news articles
+6. Synthesize context with the main query to create a targeted search
+7. Avoid generic terms and focus on actionable, newsworthy elements
+                                                 
+
+FORMULATE THE QUERY BASED ON ONLY THE KEYWORDS LIKE FINANICAL TERMS , COMPANY NAMES ETC..
+                                                
+
+Output only the optimized search query - no explanations or additional text.
+"""
+
+
+def formulate_search_query(question: str) -> str:
+    """Turn a query (plus context) into a keyword search query for financial news."""
+    query_formulation_messages = [
+        SystemMessage(content=QUERY_FORMULATION_PROMPT),
+        HumanMessage(content=question)
+    ]
+    return news_llm.get().invoke(query_formulation_messages).content.strip()
+
+
+def search_news(optimized_query: str, refresh: bool = False) -> dict:
+    """Tavily search for the optimized query, reusing recent identical searches."""
+    cache = news_cache.get()
+    key = cache.search_key(optimized_query, NEWS_TIME_RANGE, NEWS_INCLUDE_DOMAINS)
+    if not refresh:
+        cached = cache.get_search(key)
+        if cached is not None:
+            print(f"News search cache hit for: {optimized_query}")
+            return cached
+
+    enhanced_query = f"latest financial news on {optimized_query}"
+    response = tavily_client.get().search(
+        query=enhanced_query,
+        topic="finance",
+        time_range=NEWS_TIME_RANGE,
+        max_results=NEWS_SEARCH_RESULTS,
+        country="India",
+        include_domains=NEWS_INCLUDE_DOMAINS,
+        exclude_domains=NEWS_EXCLUDE_DOMAINS
+    )
+    cache.put_search(key, response)
+    return response
+
+
+def fetch_articles(urls: List[str], want: int = NEWS_ARTICLES_WANTED) -> List[dict]:
+    """
+    Extracted text of up to `want` articles, as [{"url", "text"}]. Fresh
+    cached articles are used directly; stale ones are revalidated with a
+    conditional request and only re-extracted when they changed.
+    """
+    cache = news_cache.get()
+    articles = []
+    stale: Dict[str, dict] = {}
+    to_fetch = []
+    for url in urls:
+        cached = cache.get_article(url)
+        if cached and cached["fresh"]:
+            articles.append(cached)
+        else:
+            to_fetch.append(url)
+            if cached:
+                stale[url] = cached
+
+    articles = articles[:want]
+    if len(articles) >= want or not to_fetch:
+        return articles
+
+    def conditional_headers(url: str) -> Dict[str, str]:
+        headers = {}
+        cached = stale.get(url)
+        if cached and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+        return headers
+
+    def extract_article(fetched: dict):
+        url = fetched["url"]
+        if fetched["status"] == 304:
+            cache.revalidated(url)
+            return stale[url]
+        # Parsed in a worker process; this thread only waits for the result.
+        text = extraction_pool.extract(fetched["content"])
+        if not text:
+            print(f"❌ Could not extract content from: {url}")
+            return None
+        cache.put_article(
+            url,
+            text,
+            etag=fetched["headers"].get("etag"),
+            last_modified=fetched["headers"].get("last-modified"),
+        )
+        return {"url": url, "text": text}
+
+    articles += article_fetcher.fetch_many(
+        to_fetch,
+        want=want - len(articles),
+        process=extract_article,
+        headers_for=conditional_headers,
+    )
+    return articles
+
 
 @tool
 def financial_news_search(query: str,dependency_context: str = "",
@@ -22,7 +184,6 @@ def financial_news_search(query: str,dependency_context: str = "",
         query (str): The query string that may include context from previous agents
     """
     print("news tool invoked")
-    llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0, google_api_key=os.getenv("GOOGLE_API_KEY"))
     def format_history(history: List[BaseMessage]) -> str:
         """Format message history into a string for model input."""
         formatted = ""
@@ -33,6 +194,7 @@ def financial_news_search(query: str,dependency_context: str = "",
 
     history_str = format_history(message_history)
     try:
+        llm = news_llm.get()
         # Step 1: Use LLM to intelligently formulate the search query
         question  = f"""
     Original User Query:
@@ -45,102 +207,28 @@ def financial_news_search(query: str,dependency_context: str = "",
     {history_str}
     """
 
-        
-        query_formulation_prompt = SystemMessage(content="""
-You are an expert financial research assistant. Your task is to analyze the given input (which may contain both a query , context from previous tools ,prevoious conversation history) and generate an optimized search query for financial news.
-
-The input may be in formats like:
-- "what is the current price of solana?"
-- "sector analysis based on: [previous document analysis about semiconductor industry]"
-- "market trends context: renewable energy consolidation analysis from previous step"
-
-                                                 
-
-Guidelines:
-1. Parse the input to identify the core query and any contextual information
-2. Extract key financial entities, companies, sectors, or concepts
-3. Identify the most relevant financial aspects (earnings, market trends, regulatory changes, etc.)
-4. Focus on recent developments and market-moving events
-5. Use specific financial terminology that would appear in news articles
-6. Synthesize context with the main query to create a targeted search
-7. Avoid generic terms and focus on actionable, newsworthy elements
-                                                 
-
-FORMULATE THE QUERY BASED ON ONLY THE KEYWORDS LIKE FINANICAL TERMS , COMPANY NAMES ETC..
-                                                
-
-Output only the optimized search query - no explanations or additional text.
-""")
-        
-        query_formulation_messages = [
-            query_formulation_prompt,
-            HumanMessage(content=question)
-        ]
-        
-        optimized_query = llm.invoke(query_formulation_messages).content.strip()
+        optimized_query = formulate_search_query(question)
         print(f"Optimized search query: {optimized_query}")
+        news_cache.get().record_query(optimized_query)
         
         # Step 2: Search using the optimized query
-        enhanced_query = f"latest financial news on {optimized_query}"
-        response = tavily_client.search(
-            query=enhanced_query,
-            topic="finance",
-            time_range="month",
-            max_results=3,
-            country="India",
-            include_domains=[
-                "financialexpress.com",
-                "economictimes.indiatimes.com",
-                "livemint.com",
-                "thehindu.com",
-                "wionews.com",
-                "moneycontrol.com",
-                "business-standard.com",
-                "reuters.com",
-                "bloomberg.com"
-            ],
-            exclude_domains=[
-                "reddit.com",
-                "twitter.com",
-                "facebook.com",
-                "X.com",
-                "instagram.com",
-                "youtube.com"
-            ]
-        )
+        response = search_news(optimized_query)
         
         if not response.get('results'):
             return f"No recent financial news found for: {optimized_query}"
         
-        # Step 3: Extract and process content
+        # Step 3: Fetch the articles concurrently and extract their content
         urls = [result.get('url') for result in response['results'] if result.get('url')]
+        articles = fetch_articles(urls)
+
+        # Keep only the paragraphs relevant to the search, within a token budget
+        selected = select_passages(optimized_query, articles)
         extracted_text = ""
         successful_extractions = []
-        
-        for url in urls:
-            try:
-                downloaded = trafilatura.fetch_url(url)
-                if not downloaded:
-                    print(f"❌ Could not fetch: {url}")
-                    continue
-
-                text = trafilatura.extract(
-                    downloaded,
-                    include_comments=False,
-                    include_tables=False,
-                    include_formatting=False,
-                    date_extraction_params={"extensive_search": True}
-                )
-                
-                if text:
-                    extracted_text += f"\n\n--- Article from {url} ---\n{text}"
-                    successful_extractions.append(url)
-                else:
-                    print(f"❌ Could not extract content from: {url}")
-                    
-            except Exception as e:
-                print(f"Error processing {url}: {str(e)}")
-                continue
+        for article in selected:
+            passages = "\n\n".join(article["passages"])
+            extracted_text += f"\n\n--- Article from {article['url']} ---\n{passages}"
+            successful_extractions.append(article["url"])
         
         if not extracted_text:
             return f"Could not extract content from any of the found articles for: {optimized_query}"
@@ -0,0 +1,179 @@
+import os
+import math
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 32))
+# Longest a request may wait for a slot before it is turned away.
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 15))
+ADMISSION_PER_USER = int(os.getenv("ADMISSION_PER_USER", 2))
+# Time budget of a request end to end when the caller does not give one
+# (roughly the client/proxy timeout).
+ADMISSION_REQUEST_DEADLINE = float(os.getenv("ADMISSION_REQUEST_DEADLINE", 120))
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("future", "user_id", "deadline")
+
+    def __init__(self, future: asyncio.Future, user_id: str, deadline: float):
+        self.future = future
+        self.user_id = user_id
+        self.deadline = deadline
+
+
+def _granted(future: asyncio.Future) -> bool:
+    return future.done() and not future.cancelled() and future.exception() is None
+
+
+class AdmissionController:
+    """
+    Concurrency limit for one endpoint, per worker, with load shedding.
+
+    At most `max_concurrent` requests run at once and each user may hold at
+    most `per_user` running or queued requests. Others wait in a bounded
+    FIFO queue. A request is refused straight away (Rejected, turned into
+    a 429 with Retry-After) when the queue is full or its expected wait is
+    longer than `queue_timeout` or would leave too little of its deadline
+    to run. When a slot frees up, queued requests that can no longer finish
+    before their deadline are dropped instead of run, so capacity goes to
+    requests that can still succeed. Deadlines are taken from the caller
+    (when the client gives up), not from the time the request reached the
+    controller.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int,
+        max_queue: int = ADMISSION_QUEUE_SIZE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        per_user: int = ADMISSION_PER_USER,
+        deadline: float = ADMISSION_REQUEST_DEADLINE,
+    ):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.per_user = per_user
+        self.deadline = deadline
+        self.active = 0
+        self._per_user: Dict[str, int] = {}
+        self._waiting: Deque[_Waiter] = deque()
+        # Moving average of how long an admitted request runs.
+        self.service_seconds = 10.0
+        self.counters = {"admitted": 0, "completed": 0, "rejected": 0, "expired": 0}
+
+    def _retry_after(self) -> float:
+        backlog = len(self._waiting) + 1
+        return max(1.0, math.ceil(self.service_seconds * backlog / self.max_concurrent))
+
+    def _expected_wait(self) -> float:
+        if self.active < self.max_concurrent and not self._waiting:
+            return 0.0
+        return self.service_seconds * (len(self._waiting) + 1) / self.max_concurrent
+
+    def _reject(self, reason: str) -> Rejected:
+        self.counters["rejected"] += 1
+        return Rejected(reason, self._retry_after())
+
+    def _user_done(self, user_id: str) -> None:
+        remaining = self._per_user.get(user_id, 1) - 1
+        if remaining > 0:
+            self._per_user[user_id] = remaining
+        else:
+            self._per_user.pop(user_id, None)
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        while self._waiting and self.active < self.max_concurrent:
+            waiter = self._waiting.popleft()
+            if waiter.future.done():
+                continue
+            # Not enough time left to run: shed it rather than waste the slot.
+            if waiter.deadline - now < self.service_seconds:
+                self.counters["expired"] += 1
+                waiter.future.set_exception(self._reject("request deadline would be missed"))
+                continue
+            self.active += 1
+            waiter.future.set_result(None)
+
+    async def _acquire(self, user_id: str, deadline: float) -> None:
+        if self._per_user.get(user_id, 0) >= self.per_user:
+            raise self._reject("too many concurrent requests for this user")
+        if self.active < self.max_concurrent and not self._waiting:
+            self.active += 1
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+            return
+        if len(self._waiting) >= self.max_queue:
+            raise self._reject("server is saturated")
+        expected_wait = self._expected_wait()
+        if expected_wait > self.queue_timeout:
+            raise self._reject("server is saturated")
+        if deadline - time.monotonic() < expected_wait + self.service_seconds:
+            raise self._reject("request deadline would be missed")
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), user_id, deadline)
+        self._waiting.append(waiter)
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except BaseException as e:
+            self._user_done(user_id)
+            if _granted(waiter.future):
+                # Admitted just as the wait ended: give the slot back.
+                self.active -= 1
+                self._dispatch()
+            else:
+                waiter.future.cancel()
+                try:
+                    self._waiting.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject("timed out waiting for capacity")
+            raise
+
+    def _release(self, user_id: str, started: float) -> None:
+        self.active -= 1
+        self._user_done(user_id)
+        self.counters["completed"] += 1
+        elapsed = time.monotonic() - started
+        self.service_seconds = 0.8 * self.service_seconds + 0.2 * elapsed
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, user_id: str, deadline: Optional[float] = None):
+        """
+        Hold a slot for the block. `deadline` is the time.monotonic() at
+        which the client stops waiting; by default `self.deadline` from now.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.deadline
+        await self._acquire(user_id, deadline)
+        self.counters["admitted"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(user_id, started)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "queued": sum(1 for w in self._waiting if not w.future.done()),
+            "max_queue": self.max_queue,
+            "service_seconds": round(self.service_seconds, 2),
+            **self.counters,
+        }
@@ -0,0 +1,126 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+_caches: Dict[str, "LRUCache"] = {}
+
+
+def approx_size(value: Any) -> int:
+    """Rough in-memory size of a cached value, in bytes."""
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return int(nbytes)
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            approx_size(k) + approx_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(approx_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by the approximate byte size of its
+    entries rather than their count.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_bytes: int,
+        sizeof: Callable[[Any], int] = approx_size,
+    ):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        _caches[name] = self
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = self._sizeof(value) + approx_size(key)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._sizes.pop(key)
+                del self._data[key]
+            self._data[key] = value
+            self._sizes[key] = size
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                old_key, _ = self._data.popitem(last=False)
+                self._bytes -= self._sizes.pop(old_key)
+                self.evictions += 1
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._data:
+                del self._data[key]
+                self._bytes -= self._sizes.pop(key)
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches `predicate`; returns the count."""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+                self._bytes -= self._sizes.pop(key)
+            return len(keys)
+
+    def discard_oldest_while(self, predicate: Callable[[Any], bool]) -> int:
+        """
+        Drop entries from the least recently used end for as long as
+        `predicate(value)` holds; returns the count.
+        """
+        dropped = 0
+        with self._lock:
+            while self._data:
+                key, value = next(iter(self._data.items()))
+                if not predicate(value):
+                    break
+                del self._data[key]
+                self._bytes -= self._sizes.pop(key)
+                dropped += 1
+        return dropped
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats of every LRUCache created in this process, by name."""
+    return {name: cache.stats() for name, cache in _caches.items()}
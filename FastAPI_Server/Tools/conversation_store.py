@@ -0,0 +1,461 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+from Tools.cache import LRUCache
+
+
+# Recent messages kept per session (user and assistant messages count apart).
+SHORT_TERM_WINDOW = int(os.getenv("SHORT_TERM_WINDOW", 10))
+SHORT_TERM_IDLE_TTL = float(os.getenv("SHORT_TERM_IDLE_TTL", 1800))
+SHORT_TERM_MAX_BYTES = int(os.getenv("SHORT_TERM_MAX_BYTES", 64 * 1024 * 1024))
+
+# "sqlite" and "redis" share state between workers; "memory" is per process.
+CONVERSATION_BACKEND = os.getenv("CONVERSATION_BACKEND", "sqlite").lower()
+CONVERSATION_DB = os.getenv("CONVERSATION_DB", os.getenv("SQLITE_DB_PATH", "checkpoints.sqlite"))
+CONVERSATION_REDIS_URL = os.getenv(
+    "CONVERSATION_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0")
+)
+# A session lock is a lease of SESSION_LOCK_TTL seconds that the holder
+# renews while its turn runs, so it only lapses when the holder's process
+# dies. A request waits SESSION_LOCK_WAIT seconds for the previous turn.
+SESSION_LOCK_TTL = float(os.getenv("SESSION_LOCK_TTL", 60))
+SESSION_LOCK_WAIT = float(os.getenv("SESSION_LOCK_WAIT", 120))
+
+
+class SessionBusy(TimeoutError):
+    """Another turn of the same session kept its lock for too long."""
+
+
+class ConversationBackend(ABC):
+    """
+    Storage for the recent messages of each session (as message dicts) and
+    for the per-session locks. Methods are blocking; ConversationStore runs
+    them off the event loop.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def load(self, key: str) -> Optional[List[dict]]:
+        """Stored messages of a session, or None if it is not stored."""
+
+    @abstractmethod
+    def save(self, key: str, messages: List[dict]) -> None:
+        """Store the messages of a session, replacing what was there."""
+
+    @abstractmethod
+    def append(self, key: str, messages: List[dict], window: int) -> bool:
+        """Append to a stored session; False (and no-op) if it is not stored."""
+
+    @abstractmethod
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        """Take the lock for `ttl` seconds if it is free, expired or ours."""
+
+    @abstractmethod
+    def renew(self, name: str, owner: str, ttl: float) -> bool:
+        """Extend a lock `owner` holds; False if it has lost it."""
+
+    @abstractmethod
+    def release(self, name: str, owner: str) -> None:
+        """Drop the lock, but only if `owner` still holds it."""
+
+    def stats(self) -> dict:
+        return {}
+
+
+class InProcessBackend(ConversationBackend):
+    """
+    Per-process store: an LRUCache bounded by SHORT_TERM_MAX_BYTES with an
+    idle TTL. Only correct with a single worker; also the fake for tests.
+    """
+
+    name = "memory"
+
+    def __init__(self, idle_ttl: float = SHORT_TERM_IDLE_TTL, max_bytes: int = SHORT_TERM_MAX_BYTES):
+        self.idle_ttl = idle_ttl
+        # Entries are [last_used, messages].
+        self._cache = LRUCache("short_term_messages", max_bytes=max_bytes)
+        self._locks: Dict[str, Tuple[str, float]] = {}
+        self._locks_lock = threading.Lock()
+        self.expired = 0
+
+    def _expire_idle(self) -> None:
+        cutoff = time.time() - self.idle_ttl
+        self.expired += self._cache.discard_oldest_while(lambda entry: entry[0] < cutoff)
+
+    def load(self, key: str) -> Optional[List[dict]]:
+        self._expire_idle()
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        entry[0] = time.time()
+        return list(entry[1])
+
+    def save(self, key: str, messages: List[dict]) -> None:
+        self._cache.put(key, [time.time(), list(messages)])
+
+    def append(self, key: str, messages: List[dict], window: int) -> bool:
+        self._expire_idle()
+        entry = self._cache.get(key)
+        if entry is None:
+            return False
+        # Re-put so the byte accounting sees the new messages.
+        self._cache.put(key, [time.time(), (entry[1] + messages)[-window:]])
+        return True
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._locks_lock:
+            holder = self._locks.get(name)
+            if holder and holder[0] != owner and holder[1] > now:
+                return False
+            self._locks[name] = (owner, now + ttl)
+            return True
+
+    def renew(self, name: str, owner: str, ttl: float) -> bool:
+        with self._locks_lock:
+            if self._locks.get(name, (None,))[0] != owner:
+                return False
+            self._locks[name] = (owner, time.time() + ttl)
+            return True
+
+    def release(self, name: str, owner: str) -> None:
+        with self._locks_lock:
+            if self._locks.get(name, (None,))[0] == owner:
+                del self._locks[name]
+
+    def stats(self) -> dict:
+        return dict(self._cache.stats(), expired=self.expired)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS short_term_messages (
+    key TEXT PRIMARY KEY,
+    messages TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS short_term_messages_updated ON short_term_messages (updated_at);
+CREATE TABLE IF NOT EXISTS session_locks (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class SQLiteBackend(ConversationBackend):
+    """
+    Shared by every worker on the host through one SQLite file in WAL mode
+    (by default the checkpoint database). Idle sessions are deleted every
+    few writes.
+    """
+
+    name = "sqlite"
+    EXPIRE_EVERY = 100
+
+    def __init__(self, path: str = CONVERSATION_DB, idle_ttl: float = SHORT_TERM_IDLE_TTL):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.expired = 0
+
+    def load(self, key: str) -> Optional[List[dict]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT messages, updated_at FROM short_term_messages WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < now - self.idle_ttl:
+                return None
+            self._conn.execute(
+                "UPDATE short_term_messages SET updated_at = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(row[0])
+
+    def save(self, key: str, messages: List[dict]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO short_term_messages VALUES (?, ?, ?)",
+                (key, json.dumps(messages), time.time()),
+            )
+        self._wrote()
+
+    def append(self, key: str, messages: List[dict], window: int) -> bool:
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so concurrent appends
+            # from other workers cannot interleave between read and write.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT messages, updated_at FROM short_term_messages WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or row[1] < time.time() - self.idle_ttl:
+                    self._conn.execute("ROLLBACK")
+                    return False
+                merged = (json.loads(row[0]) + messages)[-window:]
+                self._conn.execute(
+                    "UPDATE short_term_messages SET messages = ?, updated_at = ? WHERE key = ?",
+                    (json.dumps(merged), time.time(), key),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._wrote()
+        return True
+
+    def _wrote(self) -> None:
+        with self._lock:
+            self._writes += 1
+            if self._writes % self.EXPIRE_EVERY:
+                return
+            cursor = self._conn.execute(
+                "DELETE FROM short_term_messages WHERE updated_at < ?",
+                (time.time() - self.idle_ttl,),
+            )
+            self.expired += cursor.rowcount
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO session_locks VALUES (?, ?, ?)
+                   ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                   WHERE session_locks.expires_at < ? OR session_locks.owner = excluded.owner""",
+                (name, owner, now + ttl, now),
+            )
+            row = self._conn.execute(
+                "SELECT owner FROM session_locks WHERE name = ?", (name,)
+            ).fetchone()
+        return row is not None and row[0] == owner
+
+    def renew(self, name: str, owner: str, ttl: float) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE session_locks SET expires_at = ? WHERE name = ? AND owner = ?",
+                (time.time() + ttl, name, owner),
+            )
+        return cursor.rowcount > 0
+
+    def release(self, name: str, owner: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM session_locks WHERE name = ? AND owner = ?", (name, owner)
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = self._conn.execute(
+                "SELECT COUNT(*) FROM short_term_messages"
+            ).fetchone()[0]
+        return {"entries": sessions, "expired": self.expired}
+
+
+# Delete the lock only if this owner still holds it.
+_REDIS_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Extend the lock only if this owner still holds it.
+_REDIS_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class RedisBackend(ConversationBackend):
+    """Shared between workers and hosts; Redis expires idle sessions itself."""
+
+    name = "redis"
+    PREFIX = "conversation:"
+
+    def __init__(self, url: str = CONVERSATION_REDIS_URL, idle_ttl: float = SHORT_TERM_IDLE_TTL):
+        import redis
+
+        self._redis_errors = redis
+        self._redis = redis.Redis.from_url(url)
+        self._release = self._redis.register_script(_REDIS_RELEASE)
+        self._renew = self._redis.register_script(_REDIS_RENEW)
+        self.idle_ttl = int(idle_ttl)
+
+    def load(self, key: str) -> Optional[List[dict]]:
+        key = self.PREFIX + key
+        with self._redis.pipeline() as pipe:
+            pipe.get(key)
+            pipe.expire(key, self.idle_ttl)
+            payload, _ = pipe.execute()
+        return None if payload is None else json.loads(payload)
+
+    def save(self, key: str, messages: List[dict]) -> None:
+        self._redis.set(self.PREFIX + key, json.dumps(messages), ex=self.idle_ttl)
+
+    def append(self, key: str, messages: List[dict], window: int) -> bool:
+        key = self.PREFIX + key
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    payload = pipe.get(key)
+                    if payload is None:
+                        pipe.unwatch()
+                        return False
+                    merged = (json.loads(payload) + messages)[-window:]
+                    pipe.multi()
+                    pipe.set(key, json.dumps(merged), ex=self.idle_ttl)
+                    pipe.execute()
+                    return True
+                except self._redis_errors.WatchError:
+                    continue
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        key = f"{self.PREFIX}lock:{name}"
+        if self._redis.set(key, owner, nx=True, px=int(ttl * 1000)):
+            return True
+        held_by = self._redis.get(key)
+        return held_by is not None and held_by.decode() == owner
+
+    def renew(self, name: str, owner: str, ttl: float) -> bool:
+        key = f"{self.PREFIX}lock:{name}"
+        return bool(self._renew(keys=[key], args=[owner, int(ttl * 1000)]))
+
+    def release(self, name: str, owner: str) -> None:
+        self._release(keys=[f"{self.PREFIX}lock:{name}"], args=[owner])
+
+
+CONVERSATION_BACKENDS = {
+    InProcessBackend.name: InProcessBackend,
+    SQLiteBackend.name: SQLiteBackend,
+    RedisBackend.name: RedisBackend,
+}
+
+
+def load_conversation_backend(name: str = CONVERSATION_BACKEND) -> ConversationBackend:
+    try:
+        backend_cls = CONVERSATION_BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown CONVERSATION_BACKEND {name!r}; expected one of {sorted(CONVERSATION_BACKENDS)}"
+        )
+    return backend_cls()
+
+
+class ConversationStore:
+    """
+    Recent messages per (user, session), kept in a ConversationBackend so
+    every worker sees the same history.
+
+    A session that is not stored (new, idle-expired, or evicted) is rebuilt
+    with `rebuild`, which reads it back from the graph checkpoints.
+    session_lock() serializes the turns of one session across workers.
+    """
+
+    def __init__(
+        self,
+        rebuild: Callable[[str, str], Awaitable[List[BaseMessage]]],
+        backend: ConversationBackend,
+        window: int = SHORT_TERM_WINDOW,
+        lock_ttl: float = SESSION_LOCK_TTL,
+        lock_wait: float = SESSION_LOCK_WAIT,
+    ):
+        self.rebuild = rebuild
+        self.backend = backend
+        self.window = window
+        self.lock_ttl = lock_ttl
+        self.lock_wait = lock_wait
+        self.rebuilds = 0
+        self.locks_lost = 0
+
+    @staticmethod
+    def _key(user_id: str, session_id: str) -> str:
+        return json.dumps([user_id, session_id])
+
+    async def get(self, user_id: str, session_id: str) -> List[BaseMessage]:
+        key = self._key(user_id, session_id)
+        stored = await asyncio.to_thread(self.backend.load, key)
+        if stored is not None:
+            return messages_from_dict(stored)
+
+        try:
+            messages = (await self.rebuild(user_id, session_id))[-self.window:]
+            self.rebuilds += 1
+        except Exception as e:
+            print(f"Could not rebuild recent messages of {user_id}/{session_id}: {e}")
+            messages = []
+        await asyncio.to_thread(self.backend.save, key, messages_to_dict(messages))
+        return messages
+
+    async def append(self, user_id: str, session_id: str, messages: List[BaseMessage]) -> None:
+        """
+        Add a finished turn. A session that was evicted meanwhile is left
+        alone: its next get() rebuilds it, this turn included.
+        """
+        await asyncio.to_thread(
+            self.backend.append,
+            self._key(user_id, session_id),
+            messages_to_dict(messages),
+            self.window,
+        )
+
+    async def _heartbeat(self, name: str, owner: str) -> None:
+        """Renew the lease every third of its TTL while the turn runs."""
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            try:
+                renewed = await asyncio.to_thread(self.backend.renew, name, owner, self.lock_ttl)
+            except Exception as e:
+                # Transient backend error: the lease is still good until it
+                # expires, so try again on the next beat.
+                print(f"Could not renew session lock {name}: {e}")
+                continue
+            if not renewed:
+                self.locks_lost += 1
+                print(f"Session lock {name} was lost while its turn was running")
+                return
+
+    @asynccontextmanager
+    async def session_lock(self, user_id: str, session_id: str):
+        """Hold the session's lock for one turn; raises SessionBusy on timeout."""
+        name = self._key(user_id, session_id)
+        owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        deadline = time.monotonic() + self.lock_wait
+        delay = 0.05
+        while not await asyncio.to_thread(self.backend.acquire, name, owner, self.lock_ttl):
+            if time.monotonic() >= deadline:
+                raise SessionBusy(f"Session {user_id}/{session_id} is busy")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+        heartbeat = asyncio.create_task(self._heartbeat(name, owner))
+        try:
+            yield
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            await asyncio.to_thread(self.backend.release, name, owner)
+
+    def stats(self) -> dict:
+        return dict(
+            self.backend.stats(),
+            backend=self.backend.name,
+            rebuilds=self.rebuilds,
+            locks_lost=self.locks_lost,
+        )
@@ -0,0 +1,39 @@
+import os
+import re
+
+import numpy as np
+
+from Tools.cache import LRUCache
+from Tools.lazy import LazyResource
+
+
+EMBEDDINGS_MODEL_NAME = "sentence-transformers/static-retrieval-mrl-en-v1"
+
+
+def _load_embeddings_model():
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=EMBEDDINGS_MODEL_NAME)
+
+
+# Shared by every tool that needs embeddings, so the model is loaded once.
+embeddings_model = LazyResource("embeddings_model", _load_embeddings_model)
+
+query_embedding_cache = LRUCache(
+    "query_embeddings",
+    max_bytes=int(os.getenv("QUERY_EMBEDDING_CACHE_BYTES", 32 * 1024 * 1024)),
+)
+
+
+def normalize_query(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def embed_query(text: str) -> np.ndarray:
+    """Embed a query, reusing the embedding of any identical normalized query."""
+    key = normalize_query(text)
+    vector = query_embedding_cache.get(key)
+    if vector is None:
+        vector = np.asarray(embeddings_model.get().embed_query(key), dtype=np.float32)
+        query_embedding_cache.put(key, vector)
+    return vector
@@ -0,0 +1,127 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+
+NEWS_EXTRACT_WORKERS = int(os.getenv("NEWS_EXTRACT_WORKERS", 2))
+# Articles allowed to wait for a free worker on top of the ones being parsed;
+# callers beyond that wait up to NEWS_EXTRACT_TIMEOUT for a slot and then
+# give up on the article.
+NEWS_EXTRACT_QUEUE_DEPTH = int(os.getenv("NEWS_EXTRACT_QUEUE_DEPTH", 16))
+NEWS_EXTRACT_TIMEOUT = float(os.getenv("NEWS_EXTRACT_TIMEOUT", 15))
+
+
+def _extract_in_worker(html: bytes) -> Tuple[Optional[str], float]:
+    import trafilatura
+
+    started = time.perf_counter()
+    text = trafilatura.extract(
+        html,
+        include_comments=False,
+        include_tables=False,
+        include_formatting=False,
+        date_extraction_params={"extensive_search": True},
+    )
+    return text, time.perf_counter() - started
+
+
+class ExtractionPool:
+    """
+    Runs trafilatura article extraction in a bounded pool of worker
+    processes, so HTML parsing never holds the server's GIL. Raw HTML bytes
+    are handed over as soon as each article is downloaded.
+    """
+
+    def __init__(
+        self,
+        workers: int = NEWS_EXTRACT_WORKERS,
+        queue_depth: int = NEWS_EXTRACT_QUEUE_DEPTH,
+        timeout: float = NEWS_EXTRACT_TIMEOUT,
+    ):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "in_flight": 0,
+            "queue_wait_seconds": 0.0,
+            "extract_seconds": 0.0,
+            "max_extract_seconds": 0.0,
+            "input_bytes": 0,
+        }
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def _count(self, **deltas) -> None:
+        with self._stats_lock:
+            for key, delta in deltas.items():
+                self._stats[key] += delta
+
+    def _done(self) -> None:
+        self._count(in_flight=-1)
+        self._slots.release()
+
+    def extract(self, html: bytes) -> Optional[str]:
+        """Extract article text from raw HTML; None if it failed or timed out."""
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count(rejected=1)
+            print("Article extraction pool is saturated, skipping article")
+            return None
+
+        submitted = time.perf_counter()
+        self._count(submitted=1, in_flight=1, input_bytes=len(html))
+        future = None
+        try:
+            future = self._get_pool().submit(_extract_in_worker, html)
+            text, extract_seconds = future.result(timeout=self.timeout)
+        except Exception as e:
+            self._count(failed=1)
+            print(f"Article extraction failed: {e!r}")
+            return None
+        finally:
+            if future is None or future.done() or future.cancel():
+                self._done()
+            else:
+                # Still parsing in a worker: the slot is only free once it
+                # finishes, so slow pages cannot push work past the bound.
+                future.add_done_callback(lambda _: self._done())
+
+        total = time.perf_counter() - submitted
+        with self._stats_lock:
+            self._stats["completed"] += 1
+            self._stats["extract_seconds"] += extract_seconds
+            self._stats["queue_wait_seconds"] += max(0.0, total - extract_seconds)
+            self._stats["max_extract_seconds"] = max(
+                self._stats["max_extract_seconds"], extract_seconds
+            )
+        return text
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        completed = stats["completed"] or 1
+        stats["avg_extract_seconds"] = stats["extract_seconds"] / completed
+        stats["avg_queue_wait_seconds"] = stats["queue_wait_seconds"] / completed
+        stats["workers"] = self.workers
+        stats["queue_depth"] = self.queue_depth
+        return stats
+
+
+extraction_pool = ExtractionPool()
@@ -1,15 +1,22 @@
 import os
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import SystemMessage, HumanMessage,AIMessage,BaseMessage
 from langchain.tools import tool
 from typing import List, Union
+from Tools.lazy import LazyResource
 
 load_dotenv(override=True)
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash", temperature=0, google_api_key=os.getenv("GOOGLE_API_KEY")
-)
+
+def _load_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.0-flash", temperature=0, google_api_key=os.getenv("GOOGLE_API_KEY")
+    )
+
+
+llm = LazyResource("general_qna_llm", _load_llm)
 
 @tool
 def gen_qna(question: str, dependency_context: str = "",
@@ -50,7 +57,7 @@ def gen_qna(question: str, dependency_context: str = "",
         HumanMessage(content=structured_prompt)
     ]
 
-    response = llm.invoke(messages)
+    response = llm.get().invoke(messages)
     return response.content
 
 
@@ -0,0 +1,164 @@
+import os
+import time
+import asyncio
+import threading
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+
+NEWS_FETCH_MAX_CONNECTIONS = int(os.getenv("NEWS_FETCH_MAX_CONNECTIONS", 32))
+NEWS_FETCH_PER_DOMAIN = int(os.getenv("NEWS_FETCH_PER_DOMAIN", 2))
+NEWS_FETCH_TIMEOUT = float(os.getenv("NEWS_FETCH_TIMEOUT", 8))
+NEWS_USER_AGENT = os.getenv(
+    "NEWS_USER_AGENT",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0 Safari/537.36",
+)
+
+
+class ArticleFetcher:
+    """
+    Fetches web pages concurrently over one pooled HTTP client.
+
+    The client lives on a private event loop in a daemon thread, so
+    connections stay pooled across tool calls even though the tools
+    themselves are synchronous and run on whatever thread LangGraph picks.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = NEWS_FETCH_MAX_CONNECTIONS,
+        per_domain: int = NEWS_FETCH_PER_DOMAIN,
+        timeout: float = NEWS_FETCH_TIMEOUT,
+    ):
+        self.max_connections = max_connections
+        self.per_domain = per_domain
+        self.timeout = timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._domain_limits: Dict[str, asyncio.Semaphore] = {}
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="article-fetcher", daemon=True
+                ).start()
+                self._client = asyncio.run_coroutine_threadsafe(
+                    self._make_client(), loop
+                ).result()
+                self._loop = loop
+        return self._loop
+
+    async def _make_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            follow_redirects=True,
+            headers={"User-Agent": NEWS_USER_AGENT},
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+        )
+
+    def _domain_limit(self, url: str) -> asyncio.Semaphore:
+        domain = urlparse(url).netloc.lower()
+        if domain not in self._domain_limits:
+            self._domain_limits[domain] = asyncio.Semaphore(self.per_domain)
+        return self._domain_limits[domain]
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> dict:
+        """
+        GET one URL within the per-domain limit and the per-URL timeout.
+        Returns {"url", "status", "content", "headers", "elapsed"}; content is
+        the raw body bytes, or None on error.
+        """
+        started = time.perf_counter()
+        async with self._domain_limit(url):
+            try:
+                response = await asyncio.wait_for(
+                    self._client.get(url, headers=headers), self.timeout
+                )
+                return {
+                    "url": url,
+                    "status": response.status_code,
+                    "content": response.content if response.status_code == 200 else None,
+                    "headers": dict(response.headers),
+                    "elapsed": time.perf_counter() - started,
+                }
+            except Exception as e:
+                print(f"Error fetching {url}: {e!r}")
+                return {
+                    "url": url,
+                    "status": None,
+                    "content": None,
+                    "headers": {},
+                    "elapsed": time.perf_counter() - started,
+                }
+
+    async def _fetch_many(
+        self,
+        urls: List[str],
+        want: Optional[int],
+        process: Optional[Callable[[dict], Optional[dict]]],
+        headers_for: Optional[Callable[[str], Dict[str, str]]],
+    ) -> List[dict]:
+        async def fetch_and_process(url: str) -> Optional[dict]:
+            result = await self.fetch(url, headers=headers_for(url) if headers_for else None)
+            if result["status"] == 304 and process is not None:
+                # Conditional request: the caller's cached copy is still valid.
+                return await asyncio.get_running_loop().run_in_executor(
+                    None, process, result
+                )
+            if result["content"] is None:
+                print(f"❌ Could not fetch: {url} (status {result['status']})")
+                return None
+            if process is None:
+                return result
+            return await asyncio.get_running_loop().run_in_executor(None, process, result)
+
+        tasks = [asyncio.ensure_future(fetch_and_process(url)) for url in urls]
+        results = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    result = await next_done
+                except Exception as e:
+                    print(f"Error processing article: {e!r}")
+                    continue
+                if result:
+                    results.append(result)
+                    if want and len(results) >= want:
+                        break
+        finally:
+            for task in tasks:
+                task.cancel()
+        return results
+
+    def fetch_many(
+        self,
+        urls: List[str],
+        want: Optional[int] = None,
+        process: Optional[Callable[[dict], Optional[dict]]] = None,
+        headers_for: Optional[Callable[[str], Dict[str, str]]] = None,
+    ) -> List[dict]:
+        """
+        Fetch `urls` concurrently and return the successful results in
+        completion order. `process` (run off the event loop) may turn a fetch
+        result into the final item or reject it by returning None; it also
+        receives 304 responses to conditional requests built by
+        `headers_for`. Returns as soon as `want` items succeeded, cancelling
+        the slower fetches.
+        """
+        loop = self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(
+            self._fetch_many(urls, want, process, headers_for), loop
+        )
+        # Every fetch has its own timeout; this only guards against a stuck loop.
+        return future.result(timeout=self.timeout * max(1, len(urls)) + 5)
+
+
+article_fetcher = ArticleFetcher()
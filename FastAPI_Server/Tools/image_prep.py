@@ -0,0 +1,110 @@
+import io
+import os
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Tuple
+
+from PIL import Image, ImageOps, ImageSequence
+
+
+# Textract reads text reliably well below phone-camera resolution; larger
+# images only cost upload time and hit the synchronous payload limit.
+OCR_MAX_DIMENSION = int(os.getenv("OCR_MAX_DIMENSION", 2500))
+OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", 85))
+# Small JPEG/PNG uploads that need no rotation or resizing are sent as-is.
+OCR_PASSTHROUGH_BYTES = int(os.getenv("OCR_PASSTHROUGH_BYTES", 1024 * 1024))
+OCR_PREP_WORKERS = int(os.getenv("OCR_PREP_WORKERS", 4))
+
+# Pages are prepared on _executor; whole images are queued on _jobs so the
+# caller can overlap preprocessing with other work without nesting pools.
+_executor = ThreadPoolExecutor(max_workers=OCR_PREP_WORKERS, thread_name_prefix="ocr-prep")
+_jobs = ThreadPoolExecutor(max_workers=OCR_PREP_WORKERS, thread_name_prefix="ocr-prep-job")
+_totals_lock = threading.Lock()
+_totals = {"images": 0, "pages": 0, "input_bytes": 0, "output_bytes": 0, "seconds": 0.0}
+
+
+def _needs_rotation(image: Image.Image) -> bool:
+    try:
+        return image.getexif().get(0x0112, 1) != 1  # EXIF Orientation
+    except Exception:
+        return False
+
+
+def _has_alpha(image: Image.Image) -> bool:
+    return image.mode in ("RGBA", "LA", "PA") or (
+        image.mode == "P" and "transparency" in image.info
+    )
+
+
+def _prepare_page(page: Image.Image) -> bytes:
+    page = ImageOps.exif_transpose(page)
+    if _has_alpha(page):
+        # Transparent pixels are black once the alpha channel is dropped,
+        # which hides dark text; flatten onto white like a viewer would.
+        page = page.convert("RGBA")
+        background = Image.new("RGB", page.size, "white")
+        background.paste(page, mask=page.getchannel("A"))
+        page = background
+    elif page.mode not in ("RGB", "L"):
+        page = page.convert("L" if page.mode in ("1", "I;16", "I") else "RGB")
+    if max(page.size) > OCR_MAX_DIMENSION:
+        page.thumbnail((OCR_MAX_DIMENSION, OCR_MAX_DIMENSION), Image.LANCZOS)
+    out = io.BytesIO()
+    page.save(out, format="JPEG", quality=OCR_JPEG_QUALITY, optimize=True)
+    return out.getvalue()
+
+
+def preprocess_image(data: bytes) -> Tuple[List[bytes], dict]:
+    """
+    Prepare an uploaded image for OCR: auto-orient from EXIF, downscale to at
+    most OCR_MAX_DIMENSION pixels on the long side and recompress as JPEG.
+    Multi-page TIFFs are split into one image per page, prepared in parallel.
+    Returns the page images and a report of bytes saved and time spent.
+    """
+    started = time.perf_counter()
+    image = Image.open(io.BytesIO(data))
+    page_count = getattr(image, "n_frames", 1)
+
+    if (
+        page_count == 1
+        and image.format in ("JPEG", "PNG")
+        and len(data) <= OCR_PASSTHROUGH_BYTES
+        and max(image.size) <= OCR_MAX_DIMENSION
+        and not _needs_rotation(image)
+        and not _has_alpha(image)
+    ):
+        pages = [data]
+    else:
+        frames = [frame.copy() for frame in ImageSequence.Iterator(image)]
+        pages = list(_executor.map(_prepare_page, frames))
+
+    report = {
+        "pages": len(pages),
+        "input_bytes": len(data),
+        "output_bytes": sum(len(p) for p in pages),
+        "seconds": time.perf_counter() - started,
+    }
+    report["bytes_saved"] = report["input_bytes"] - report["output_bytes"]
+    with _totals_lock:
+        _totals["images"] += 1
+        for key in ("pages", "input_bytes", "output_bytes", "seconds"):
+            _totals[key] += report[key]
+    print(
+        f"Preprocessed image into {report['pages']} page(s): "
+        f"{report['input_bytes']} -> {report['output_bytes']} bytes "
+        f"in {report['seconds']:.2f}s"
+    )
+    return pages, report
+
+
+def submit_preprocess(data: bytes) -> "Future[Tuple[List[bytes], dict]]":
+    """Start preprocess_image in the background."""
+    return _jobs.submit(preprocess_image, data)
+
+
+def prep_stats() -> dict:
+    with _totals_lock:
+        totals = dict(_totals)
+    totals["bytes_saved"] = totals["input_bytes"] - totals["output_bytes"]
+    return totals
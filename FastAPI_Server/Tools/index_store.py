@@ -0,0 +1,144 @@
+import os
+import json
+import uuid
+import shutil
+import sqlite3
+import threading
+from typing import Dict, List, Union
+
+from langchain_core.documents import Document
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.sqlite"
+
+
+def _mmap_flags(faiss) -> int:
+    # Flat indexes can only be memory-mapped on faiss builds that expose
+    # IO_FLAG_MMAP_IFC; older builds fall back to IO_FLAG_MMAP, which is
+    # honoured for the index types that support it and ignored otherwise.
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+class SQLiteDocstore(Docstore):
+    """Read-only docstore that fetches chunk texts from a SQLite file by row id."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        # The file is renamed into place once and never modified afterwards,
+        # so it can be opened immutable: no locking, no journal lookups.
+        self._conn = sqlite3.connect(
+            f"file:{db_path}?mode=ro&immutable=1", uri=True, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+
+    def search(self, search: str) -> Union[str, Document]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, metadata FROM chunks WHERE id = ?", (int(search),)
+            ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+    def search_many(self, ids: List[str]) -> List[Document]:
+        """Fetch several chunks in one query, preserving the order of `ids`."""
+        if not ids:
+            return []
+        placeholders = ",".join("?" for _ in ids)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, text, metadata FROM chunks WHERE id IN ({placeholders})",
+                [int(i) for i in ids],
+            ).fetchall()
+        by_id = {
+            str(row[0]): Document(page_content=row[1], metadata=json.loads(row[2]))
+            for row in rows
+        }
+        return [by_id[i] for i in ids if i in by_id]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def is_index_dir(path: str) -> bool:
+    """True when `path` holds an index written by `save_index`."""
+    return os.path.isfile(os.path.join(path, INDEX_FILE)) and os.path.isfile(
+        os.path.join(path, CHUNKS_FILE)
+    )
+
+
+def save_index(vector_store: FAISS, path: str) -> None:
+    """
+    Persist a FAISS vector store without pickle: the raw index goes to
+    index.faiss and the chunk texts/metadata to chunks.sqlite, keyed by the
+    position of each vector in the index.
+
+    The files are written to a temporary sibling directory and renamed into
+    place, so concurrent readers never observe a half-written index.
+    """
+    import faiss
+
+    tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+    os.makedirs(tmp_path)
+    try:
+        faiss.write_index(vector_store.index, os.path.join(tmp_path, INDEX_FILE))
+
+        conn = sqlite3.connect(os.path.join(tmp_path, CHUNKS_FILE))
+        try:
+            conn.execute(
+                "CREATE TABLE chunks (id INTEGER PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+            )
+            rows = []
+            for position, doc_id in vector_store.index_to_docstore_id.items():
+                doc = vector_store.docstore.search(doc_id)
+                rows.append((position, doc.page_content, json.dumps(doc.metadata)))
+            conn.executemany("INSERT INTO chunks VALUES (?, ?, ?)", rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+        # Replace any older cache (including the legacy pickle layout). It
+        # is moved aside rather than deleted in place, so readers see either
+        # the old or the new index; the ".tmp-" name keeps the sweeper off it.
+        old_path = None
+        if os.path.exists(path):
+            old_path = f"{path}.tmp-old-{uuid.uuid4().hex}"
+            try:
+                os.rename(path, old_path)
+            except OSError:
+                old_path = None
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another worker finished the same document first; keep theirs.
+            if not is_index_dir(path):
+                raise
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        if old_path:
+            shutil.rmtree(old_path, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+
+def load_index(path: str, embeddings) -> FAISS:
+    """
+    Open an index written by `save_index`. The vectors are memory-mapped
+    read-only, so workers opening the same document share the OS page cache,
+    and chunk texts are only read from SQLite when a search returns them.
+    """
+    import faiss
+
+    index = faiss.read_index(os.path.join(path, INDEX_FILE), _mmap_flags(faiss))
+    docstore = SQLiteDocstore(os.path.join(path, CHUNKS_FILE))
+    index_to_docstore_id: Dict[int, str] = {i: str(i) for i in range(index.ntotal)}
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
@@ -0,0 +1,352 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set
+
+
+JOBS_DB = os.getenv("JOBS_DB", os.getenv("SQLITE_DB_PATH", "checkpoints.sqlite"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2))
+# Running jobs are marked alive every JOB_HEARTBEAT_INTERVAL seconds; one
+# without a heartbeat for JOB_STALE_AFTER seconds is assumed lost with its
+# worker process and is queued again (up to JOB_MAX_ATTEMPTS runs).
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", 30))
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", 120))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 2))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", 7 * 86400))
+JOB_MAX_PENDING_PER_USER = int(os.getenv("JOB_MAX_PENDING_PER_USER", 20))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL,
+    files TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_user_status ON jobs (user_id, status);
+"""
+# Columns added after the table was first created, for existing databases.
+MIGRATIONS = {
+    "heartbeat_at": "ALTER TABLE jobs ADD COLUMN heartbeat_at REAL",
+    "files": "ALTER TABLE jobs ADD COLUMN files TEXT NOT NULL DEFAULT '[]'",
+}
+
+
+class RetryLater(Exception):
+    """Raised by a job handler to put its job back in the queue."""
+
+
+class JobStore:
+    """
+    Persistent job queue in SQLite (WAL), by default in the checkpoint
+    database. Claiming is a single transaction, so any number of workers
+    and processes can pull from the same queue. A job's result is only
+    recorded by the run (attempt) that currently owns it.
+    """
+
+    def __init__(self, path: str = JOBS_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, statement in MIGRATIONS.items():
+            if column not in columns:
+                self._conn.execute(statement)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["files"] = json.loads(job["files"])
+        if job["result"] is not None:
+            job["result"] = json.loads(job["result"])
+        return job
+
+    def create(
+        self,
+        kind: str,
+        user_id: str,
+        session_id: str,
+        payload: dict,
+        files: Sequence[str] = (),
+    ) -> str:
+        """Queue a job; `files` are uploads it needs, kept until it ends."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO jobs (id, kind, user_id, session_id, status, payload, files, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    job_id,
+                    kind,
+                    user_id,
+                    session_id,
+                    QUEUED,
+                    json.dumps(payload),
+                    json.dumps(list(files)),
+                    time.time(),
+                ),
+            )
+        return job_id
+
+    def pending_for_user(self, user_id: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE user_id = ? AND status IN (?, ?)",
+                (user_id, QUEUED, RUNNING),
+            ).fetchone()[0]
+
+    def claim_next(self) -> Optional[dict]:
+        """
+        Mark the oldest queued job as running and return it. Jobs of a
+        session that already has a running job wait, so the turns of one
+        session run one after another and in order.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.row_factory = sqlite3.Row
+                row = self._conn.execute(
+                    """SELECT * FROM jobs AS queued WHERE status = ?
+                       AND NOT EXISTS (
+                           SELECT 1 FROM jobs AS running
+                           WHERE running.status = ?
+                             AND running.user_id = queued.user_id
+                             AND running.session_id = queued.session_id
+                       )
+                       ORDER BY created_at LIMIT 1""",
+                    (QUEUED, RUNNING),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                now = time.time()
+                self._conn.execute(
+                    """UPDATE jobs SET status = ?, started_at = ?, heartbeat_at = ?,
+                       attempts = attempts + 1 WHERE id = ?""",
+                    (RUNNING, now, now, row["id"]),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._conn.row_factory = None
+        job = self._row_to_job(row)
+        job.update(status=RUNNING, started_at=now, heartbeat_at=now, attempts=job["attempts"] + 1)
+        return job
+
+    def _update_run(self, job: dict, assignments: str, values: tuple) -> bool:
+        """Update a running job, only if `job` is still the run that owns it."""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ? AND attempts = ? AND status = ?",
+                (*values, job["id"], job["attempts"], RUNNING),
+            )
+        return cursor.rowcount > 0
+
+    def heartbeat(self, job: dict) -> bool:
+        return self._update_run(job, "heartbeat_at = ?", (time.time(),))
+
+    def finish(self, job: dict, result: Any) -> bool:
+        return self._update_run(
+            job,
+            "status = ?, result = ?, finished_at = ?",
+            (SUCCEEDED, json.dumps(result), time.time()),
+        )
+
+    def fail(self, job: dict, error: str) -> bool:
+        return self._update_run(
+            job, "status = ?, error = ?, finished_at = ?", (FAILED, error, time.time())
+        )
+
+    def requeue(self, job: dict) -> bool:
+        """Put a running job back in the queue without using up an attempt."""
+        return self._update_run(
+            job,
+            "status = ?, attempts = attempts - 1, started_at = NULL, heartbeat_at = NULL",
+            (QUEUED,),
+        )
+
+    def active_files(self) -> Set[str]:
+        """Uploads needed by queued or running jobs."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT files FROM jobs WHERE status IN (?, ?) AND files != '[]'",
+                (QUEUED, RUNNING),
+            ).fetchall()
+        return {path for (files,) in rows for path in json.loads(files)}
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            self._conn.row_factory = sqlite3.Row
+            try:
+                row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            finally:
+                self._conn.row_factory = None
+        return self._row_to_job(row) if row else None
+
+    def recover_stale(self) -> int:
+        """Requeue jobs whose worker died mid-run; fail them after JOB_MAX_ATTEMPTS."""
+        cutoff = time.time() - JOB_STALE_AFTER
+        with self._lock:
+            self._conn.execute(
+                """UPDATE jobs SET status = ?, error = 'worker lost', finished_at = ?
+                   WHERE status = ? AND COALESCE(heartbeat_at, started_at) < ? AND attempts >= ?""",
+                (FAILED, time.time(), RUNNING, cutoff, JOB_MAX_ATTEMPTS),
+            )
+            cursor = self._conn.execute(
+                """UPDATE jobs SET status = ?
+                   WHERE status = ? AND COALESCE(heartbeat_at, started_at) < ?""",
+                (QUEUED, RUNNING, cutoff),
+            )
+            return cursor.rowcount
+
+    def purge(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (SUCCEEDED, FAILED, time.time() - JOB_RESULT_TTL),
+            )
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+
+class JobRunner:
+    """
+    Pool of JOB_WORKERS asyncio tasks running queued jobs with `handler`.
+    Workers wake up on local submissions and otherwise poll the store, so
+    jobs submitted to another process are picked up too. A handler raising
+    RetryLater puts its job back in the queue.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        handler: Callable[[dict], Awaitable[Any]],
+        workers: int = JOB_WORKERS,
+    ):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[str, dict] = {}
+        self.requeued = 0
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._maintain()))
+
+    def notify(self) -> None:
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim_next)
+            except Exception as e:
+                print(f"Could not claim a job: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._run(job)
+            except Exception as e:
+                self._running.pop(job["id"], None)
+                print(f"Could not record the outcome of job {job['id']}: {e}")
+
+    async def _run(self, job: dict) -> None:
+        self._running[job["id"]] = job
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            result = await self.handler(job)
+            recorded = await asyncio.to_thread(self.store.finish, job, result)
+        except RetryLater as e:
+            print(f"Job {job['id']} requeued: {e}")
+            self.requeued += 1
+            recorded = await asyncio.to_thread(self.store.requeue, job)
+        except Exception as e:
+            print(f"Job {job['id']} failed: {e}")
+            recorded = await asyncio.to_thread(self.store.fail, job, str(e))
+        finally:
+            # On cancellation (shutdown) the job stays in _running and
+            # stop() puts it back in the queue.
+            heartbeat.cancel()
+        del self._running[job["id"]]
+        if not recorded:
+            print(f"Job {job['id']} was taken over by another run; result discarded")
+
+    async def _heartbeat(self, job: dict) -> None:
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+            try:
+                await asyncio.to_thread(self.store.heartbeat, job)
+            except Exception as e:
+                print(f"Could not record heartbeat of job {job['id']}: {e}")
+
+    async def _maintain(self) -> None:
+        while True:
+            try:
+                requeued = await asyncio.to_thread(self.store.recover_stale)
+                if requeued:
+                    print(f"Requeued {requeued} stale jobs")
+                    self.notify()
+                await asyncio.to_thread(self.store.purge)
+            except Exception as e:
+                print(f"Job maintenance failed: {e}")
+            await asyncio.sleep(max(60.0, JOB_POLL_INTERVAL))
+
+    async def stop(self) -> None:
+        """Cancel the workers and put the jobs they were running back in the queue."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for job in list(self._running.values()):
+            try:
+                await asyncio.to_thread(self.store.requeue, job)
+            except Exception as e:
+                print(f"Could not requeue job {job['id']}: {e}")
+        self._running.clear()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": len(self._running),
+            "requeued": self.requeued,
+            **self.store.stats(),
+        }
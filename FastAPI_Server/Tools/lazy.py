@@ -0,0 +1,93 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+_resources: Dict[str, "LazyResource"] = {}
+_phases: Dict[str, float] = {}
+
+
+class LazyResource:
+    """
+    A heavy dependency (model, API client, ...) that is only built the first
+    time it is used. Construction is thread-safe and timed, so startup cost
+    can be reported per component. A failed construction is not cached: the
+    error surfaces at the call site and the next call tries again.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self._factory = factory
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        _resources[name] = self
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self) -> Any:
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                started = time.perf_counter()
+                try:
+                    self._value = self._factory()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.load_seconds = time.perf_counter() - started
+                self.error = None
+                self._loaded = True
+                print(f"Loaded {self.name} in {self.load_seconds:.2f}s")
+        return self._value
+
+
+@contextmanager
+def timed_phase(name: str):
+    """Record how long a startup phase (e.g. opening the checkpointer) took."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases[name] = time.perf_counter() - started
+
+
+def record_phase(name: str, seconds: float) -> None:
+    _phases[name] = seconds
+
+
+def warm_up(names: Optional[Iterable[str]] = None) -> None:
+    """Build the given resources (all registered ones by default)."""
+    for name in list(names) if names else list(_resources):
+        resource = _resources.get(name)
+        if resource is None:
+            print(f"Warm-up: unknown resource {name}")
+            continue
+        try:
+            resource.get()
+        except Exception as e:
+            print(f"Warm-up of {name} failed: {e}")
+
+
+def startup_report() -> Dict[str, Any]:
+    return {
+        "phases": {name: round(seconds, 4) for name, seconds in _phases.items()},
+        "resources": {
+            name: {
+                "loaded": resource.loaded,
+                "load_seconds": (
+                    round(resource.load_seconds, 4)
+                    if resource.load_seconds is not None
+                    else None
+                ),
+                "error": resource.error,
+            }
+            for name, resource in _resources.items()
+        },
+    }
@@ -0,0 +1,197 @@
+import os
+import asyncio
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+
+MEMORY_WRITE_QUEUE_SIZE = int(os.getenv("MEMORY_WRITE_QUEUE_SIZE", 1000))
+MEMORY_WRITE_BATCH_SIZE = int(os.getenv("MEMORY_WRITE_BATCH_SIZE", 20))
+# How long to wait for more turns before writing a partial batch.
+MEMORY_WRITE_BATCH_WAIT = float(os.getenv("MEMORY_WRITE_BATCH_WAIT", 0.5))
+# Mem0 writes in flight at once (each takes seconds).
+MEMORY_WRITE_CONCURRENCY = int(os.getenv("MEMORY_WRITE_CONCURRENCY", 4))
+MEMORY_WRITE_RETRIES = int(os.getenv("MEMORY_WRITE_RETRIES", 3))
+MEMORY_WRITE_BACKOFF = float(os.getenv("MEMORY_WRITE_BACKOFF", 1.0))
+
+Turn = Tuple[str, str, List[dict]]
+SessionKey = Tuple[str, str]
+
+
+class MemoryWriteQueue:
+    """
+    Write-behind queue for conversation turns going to Mem0.
+
+    Requests enqueue a turn and return. A background task drains the queue
+    in batches, merges the turns of the same (user, session) into a single
+    write and runs up to `concurrency` writes at once. Failed writes are
+    retried with exponential backoff without holding a slot, and a session
+    has at most one write in flight; turns arriving meanwhile are merged
+    into its next write, so its memories stay in order. The queue is
+    bounded: when it is full new turns are dropped and counted rather than
+    slowing down responses.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[str, str, List[dict]], Any],
+        on_written: Optional[Callable[[str, str], None]] = None,
+        max_size: int = MEMORY_WRITE_QUEUE_SIZE,
+        concurrency: int = MEMORY_WRITE_CONCURRENCY,
+    ):
+        self.write = write
+        self.on_written = on_written
+        self.max_size = max_size
+        self.concurrency = concurrency
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Sessions with a write in flight or waiting to retry, mapped to the
+        # turns that arrived for them in the meantime.
+        self._busy: Dict[SessionKey, Tuple[List[dict], int]] = {}
+        self._writers: Set[asyncio.Task] = set()
+        self._retry_handles: Set[asyncio.TimerHandle] = set()
+        self._outstanding = 0
+        self._idle: Optional[asyncio.Event] = None
+        self._closing = False
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retries = 0
+
+    def start(self) -> None:
+        """Start the writer task; must be called from the running event loop."""
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, user_id: str, session_id: str, messages: List[dict]) -> bool:
+        if self._queue is None or self._closing:
+            self.dropped += 1
+            print(f"Memory write for {user_id}/{session_id} dropped: queue not running")
+            return False
+        try:
+            self._queue.put_nowait((user_id, session_id, messages))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"Memory write queue full, dropped turn for {user_id}/{session_id}")
+            return False
+        self._outstanding += 1
+        self._idle.clear()
+        return True
+
+    async def _next_batch(self) -> List[Turn]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + MEMORY_WRITE_BATCH_WAIT
+        while len(batch) < MEMORY_WRITE_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            grouped: Dict[SessionKey, Tuple[List[dict], int]] = OrderedDict()
+            for user_id, session_id, messages in batch:
+                merged, turns = grouped.get((user_id, session_id), ([], 0))
+                grouped[(user_id, session_id)] = (merged + messages, turns + 1)
+
+            for key, (messages, turns) in grouped.items():
+                if key in self._busy:
+                    pending, pending_turns = self._busy[key]
+                    self._busy[key] = (pending + messages, pending_turns + turns)
+                    continue
+                self._busy[key] = ([], 0)
+                # Wait for a free slot here, so a backlog stays in the
+                # bounded queue instead of piling up as tasks.
+                await self._slots.acquire()
+                self._spawn(self._write(key, messages, turns, 0))
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._writers.add(task)
+        task.add_done_callback(self._writers.discard)
+
+    async def _resume(self, key: SessionKey, messages: List[dict], turns: int, attempt: int) -> None:
+        """Write again for a busy session, including turns queued meanwhile."""
+        await self._slots.acquire()
+        pending, pending_turns = self._busy.get(key, ([], 0))
+        self._busy[key] = ([], 0)
+        await self._write(key, messages + pending, turns + pending_turns, attempt)
+
+    async def _write(self, key: SessionKey, messages: List[dict], turns: int, attempt: int) -> None:
+        """Run one write; the caller holds a slot, which is released here."""
+        user_id, session_id = key
+        try:
+            await asyncio.to_thread(self.write, user_id, session_id, messages)
+        except Exception as e:
+            self._slots.release()
+            if attempt < MEMORY_WRITE_RETRIES:
+                self.retries += 1
+                self._schedule_retry(key, messages, turns, attempt + 1)
+                return
+            self.failed += 1
+            print(f"Giving up on memory write for {user_id}/{session_id}: {e}")
+        except BaseException:
+            self._slots.release()
+            raise
+        else:
+            self._slots.release()
+            self.written += 1
+            if self.on_written:
+                self.on_written(user_id, session_id)
+        self._finish(key, turns)
+
+    def _schedule_retry(self, key: SessionKey, messages: List[dict], turns: int, attempt: int) -> None:
+        def fire():
+            self._retry_handles.discard(handle)
+            self._spawn(self._resume(key, messages, turns, attempt))
+
+        delay = MEMORY_WRITE_BACKOFF * 2 ** (attempt - 1)
+        handle = asyncio.get_running_loop().call_later(delay, fire)
+        self._retry_handles.add(handle)
+
+    def _finish(self, key: SessionKey, turns: int) -> None:
+        self._outstanding -= turns
+        pending, pending_turns = self._busy.pop(key, ([], 0))
+        if pending_turns:
+            self._busy[key] = ([], 0)
+            self._spawn(self._resume(key, pending, pending_turns, 0))
+        elif self._outstanding <= 0:
+            self._idle.set()
+
+    async def close(self, timeout: float) -> None:
+        """Stop accepting turns and flush the queue, waiting at most `timeout`."""
+        self._closing = True
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Memory write queue not flushed, {self._outstanding} turns lost")
+        for handle in self._retry_handles:
+            handle.cancel()
+        tasks = [t for t in (self._task, *self._writers) if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_size": self.max_size,
+            "concurrency": self.concurrency,
+            "in_flight": len(self._writers),
+            "waiting_retry": len(self._retry_handles),
+            "written": self.written,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "retries": self.retries,
+        }
@@ -0,0 +1,91 @@
+import os
+import hashlib
+from typing import List
+
+import numpy as np
+
+from Tools.cache import LRUCache
+from Tools.embeddings import embed_query, embeddings_model
+from Tools.passages import estimate_tokens
+
+
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", 8))
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", 400))
+
+# Keyed by memory id and a hash of its text, so an updated memory is re-embedded.
+memory_embedding_cache = LRUCache(
+    "memory_embeddings",
+    max_bytes=int(os.getenv("MEMORY_EMBEDDING_CACHE_BYTES", 32 * 1024 * 1024)),
+)
+
+
+def _memory_key(memory: dict) -> tuple:
+    text = memory.get("memory", "")
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+    return (memory.get("id") or digest, digest)
+
+
+def memory_vectors(memories: List[dict]) -> np.ndarray:
+    """Embeddings of `memories`, computing only the ones not cached yet."""
+    keys = [_memory_key(m) for m in memories]
+    vectors = [memory_embedding_cache.get(key) for key in keys]
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        computed = embeddings_model.get().embed_documents(
+            [memories[i].get("memory", "") for i in missing]
+        )
+        for i, vector in zip(missing, computed):
+            vectors[i] = np.asarray(vector, dtype=np.float32)
+            memory_embedding_cache.put(keys[i], vectors[i])
+    return np.vstack(vectors)
+
+
+def _within_budget(texts: List[str], k: int, token_budget: int) -> List[str]:
+    chosen = []
+    used = 0
+    for text in texts:
+        if len(chosen) >= k:
+            break
+        cost = estimate_tokens(text)
+        if used + cost > token_budget:
+            continue
+        chosen.append(text)
+        used += cost
+    return chosen
+
+
+def select_memories(
+    query: str,
+    memories: List[dict],
+    k: int = MEMORY_TOP_K,
+    token_budget: int = MEMORY_TOKEN_BUDGET,
+) -> List[str]:
+    """
+    The texts of the (at most `k`) Mem0 memories most relevant to `query`,
+    within `token_budget`, most relevant first. Falls back to the newest
+    memories if embedding fails.
+    """
+    memories = [m for m in memories if m.get("memory")]
+    if not memories:
+        return []
+    newest_first = sorted(
+        memories,
+        key=lambda m: m.get("updated_at") or m.get("created_at") or "",
+        reverse=True,
+    )
+    texts = [m["memory"] for m in newest_first]
+    if len(texts) <= k and sum(estimate_tokens(t) for t in texts) <= token_budget:
+        return texts
+
+    try:
+        query_vector = embed_query(query)
+        vectors = memory_vectors(newest_first)
+        norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+        scores = vectors @ query_vector / np.where(norms == 0, 1.0, norms)
+        texts = [texts[i] for i in np.argsort(-scores, kind="stable")]
+    except Exception as e:
+        print(f"Embedding memories failed, using the newest ones: {e}")
+
+    chosen = _within_budget(texts, k, token_budget)
+    print(f"Selected {len(chosen)} of {len(memories)} memories for the query")
+    return chosen
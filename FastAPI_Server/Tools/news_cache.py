@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Any, List, Optional
+
+
+NEWS_CACHE_DB = os.getenv("NEWS_CACHE_DB", "news_cache.sqlite")
+# Extracted article text is reused for NEWS_ARTICLE_TTL seconds; after that it
+# is revalidated with If-None-Match / If-Modified-Since when possible.
+NEWS_ARTICLE_TTL = float(os.getenv("NEWS_ARTICLE_TTL", 6 * 3600))
+NEWS_SEARCH_TTL = float(os.getenv("NEWS_SEARCH_TTL", 600))
+NEWS_CACHE_MAX_BYTES = int(os.getenv("NEWS_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+NEWS_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("NEWS_SEARCH_CACHE_MAX_ENTRIES", 2000))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    url TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS articles_accessed ON articles (accessed_at);
+CREATE TABLE IF NOT EXISTS searches (
+    key TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS searches_accessed ON searches (accessed_at);
+CREATE TABLE IF NOT EXISTS queries (
+    query TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class NewsCache:
+    """
+    On-disk cache for the News tool, shared by every worker on the host.
+
+    Two levels: extracted article text keyed by URL (with the ETag and
+    Last-Modified validators of the response it came from), and Tavily search
+    results keyed by the search parameters. Both are trimmed least recently
+    used first. The database runs in WAL mode so readers in one worker are
+    not blocked by writes from another.
+    """
+
+    # Trimming scans the tables, so only do it every few writes.
+    EVICT_EVERY = 50
+
+    def __init__(self, path: str = NEWS_CACHE_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    # ---- articles -------------------------------------------------------
+
+    def get_article(self, url: str) -> Optional[dict]:
+        """Cached article with a `fresh` flag telling whether it is within TTL."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, etag, last_modified, fetched_at FROM articles WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE articles SET accessed_at = ? WHERE url = ?", (now, url)
+            )
+            self._conn.commit()
+        return {
+            "url": url,
+            "text": row[0],
+            "etag": row[1],
+            "last_modified": row[2],
+            "fresh": now - row[3] < NEWS_ARTICLE_TTL,
+        }
+
+    def put_article(
+        self,
+        url: str,
+        text: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, text, etag, last_modified, now, now, len(text.encode("utf-8"))),
+            )
+            self._conn.commit()
+        self._wrote()
+
+    def revalidated(self, url: str) -> None:
+        """The origin answered 304 Not Modified: the cached text is fresh again."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE articles SET fetched_at = ?, accessed_at = ? WHERE url = ?",
+                (now, now, url),
+            )
+            self._conn.commit()
+
+    # ---- searches -------------------------------------------------------
+
+    @staticmethod
+    def search_key(query: str, time_range: str, domains: List[str]) -> str:
+        raw = json.dumps(
+            [" ".join(query.lower().split()), time_range, sorted(domains)]
+        )
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get_search(self, key: str, max_age: float = NEWS_SEARCH_TTL) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, created_at FROM searches WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] >= max_age:
+                return None
+            self._conn.execute(
+                "UPDATE searches SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put_search(self, key: str, payload: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?)",
+                (key, json.dumps(payload), now, now),
+            )
+            self._conn.commit()
+        self._wrote()
+
+    # ---- query log ------------------------------------------------------
+
+    def record_query(self, query: str) -> None:
+        """Count an interactive News search, for picking topics to prefetch."""
+        query = " ".join(query.split())
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO queries VALUES (?, 1, ?)
+                   ON CONFLICT(query) DO UPDATE SET hits = hits + 1, last_used = excluded.last_used""",
+                (query, time.time()),
+            )
+            self._conn.commit()
+
+    def hot_queries(self, limit: int, window: float, half_life: float) -> List[str]:
+        """Most searched queries of the last `window` seconds, decayed by age."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM queries WHERE last_used < ?", (now - window,))
+            self._conn.commit()
+            rows = self._conn.execute("SELECT query, hits, last_used FROM queries").fetchall()
+        ranked = sorted(
+            rows,
+            key=lambda row: row[1] * 0.5 ** ((now - row[2]) / half_life),
+            reverse=True,
+        )
+        return [row[0] for row in ranked[:limit]]
+
+    def try_acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Let one worker on the host run a periodic job; True if `owner` holds it."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO leases VALUES (?, ?, ?)
+                   ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                   WHERE leases.expires_at < ? OR leases.owner = excluded.owner""",
+                (name, owner, now + ttl, now),
+            )
+            self._conn.commit()
+            row = self._conn.execute(
+                "SELECT owner FROM leases WHERE name = ?", (name,)
+            ).fetchone()
+        return row is not None and row[0] == owner
+
+    # ---- eviction -------------------------------------------------------
+
+    def _wrote(self) -> None:
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            try:
+                self.evict()
+            except sqlite3.Error as e:
+                print(f"News cache eviction failed: {e}")
+
+    def evict(self) -> None:
+        with self._lock:
+            total = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM articles"
+            ).fetchone()[0]
+            if total > NEWS_CACHE_MAX_BYTES:
+                freed = 0
+                stale = []
+                for url, size in self._conn.execute(
+                    "SELECT url, size FROM articles ORDER BY accessed_at"
+                ):
+                    if total - freed <= NEWS_CACHE_MAX_BYTES * 0.9:
+                        break
+                    stale.append((url,))
+                    freed += size
+                self._conn.executemany("DELETE FROM articles WHERE url = ?", stale)
+
+            self._conn.execute(
+                "DELETE FROM searches WHERE created_at < ?",
+                (time.time() - NEWS_SEARCH_TTL,),
+            )
+            self._conn.execute(
+                """DELETE FROM searches WHERE key NOT IN (
+                       SELECT key FROM searches ORDER BY accessed_at DESC LIMIT ?
+                   )""",
+                (NEWS_SEARCH_CACHE_MAX_ENTRIES,),
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            articles, article_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM articles"
+            ).fetchone()
+            searches = self._conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+        return {
+            "articles": articles,
+            "article_bytes": article_bytes,
+            "max_bytes": NEWS_CACHE_MAX_BYTES,
+            "searches": searches,
+        }
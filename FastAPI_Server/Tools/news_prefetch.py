@@ -0,0 +1,94 @@
+import os
+import time
+import uuid
+from typing import Callable, List, Optional
+
+from Tools.News import (
+    NEWS_INCLUDE_DOMAINS,
+    NEWS_TIME_RANGE,
+    formulate_search_query,
+    fetch_articles,
+    news_cache,
+    search_news,
+)
+from Tools.news_cache import NEWS_SEARCH_TTL
+
+
+# Prefetching spends Tavily and LLM credits on nobody's behalf, so it is
+# opt-in and every cycle is capped in topics, LLM calls and wall time.
+NEWS_PREFETCH_ENABLED = os.getenv("NEWS_PREFETCH_ENABLED", "false").lower() == "true"
+NEWS_PREFETCH_INTERVAL = float(os.getenv("NEWS_PREFETCH_INTERVAL", 300))
+NEWS_PREFETCH_MAX_TOPICS = int(os.getenv("NEWS_PREFETCH_MAX_TOPICS", 10))
+NEWS_PREFETCH_MEMORY_TOPICS = int(os.getenv("NEWS_PREFETCH_MEMORY_TOPICS", 3))
+NEWS_PREFETCH_MAX_SECONDS = float(os.getenv("NEWS_PREFETCH_MAX_SECONDS", 120))
+NEWS_PREFETCH_QUERY_WINDOW = float(os.getenv("NEWS_PREFETCH_QUERY_WINDOW", 3 * 86400))
+NEWS_PREFETCH_HALF_LIFE = float(os.getenv("NEWS_PREFETCH_HALF_LIFE", 6 * 3600))
+
+
+class NewsPrefetcher:
+    """
+    Keeps the News search and article caches warm for the topics users keep
+    asking about: the most frequent recent optimized queries, plus search
+    queries derived from recent Mem0 memories of active users.
+
+    Only one worker per host runs a cycle at a time (a lease in the News
+    cache database), since the caches are shared.
+    """
+
+    def __init__(self, memory_source: Optional[Callable[[], List[str]]] = None):
+        self.memory_source = memory_source
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.last_cycle: Optional[dict] = None
+
+    def _memory_topics(self) -> List[str]:
+        if not self.memory_source or NEWS_PREFETCH_MEMORY_TOPICS <= 0:
+            return []
+        topics = []
+        for memory in self.memory_source()[:NEWS_PREFETCH_MEMORY_TOPICS]:
+            try:
+                topics.append(formulate_search_query(f"Original User Query:\n{memory}"))
+            except Exception as e:
+                print(f"News prefetch could not derive a topic from memory: {e}")
+        return topics
+
+    def topics(self) -> List[str]:
+        cache = news_cache.get()
+        topics = cache.hot_queries(
+            NEWS_PREFETCH_MAX_TOPICS, NEWS_PREFETCH_QUERY_WINDOW, NEWS_PREFETCH_HALF_LIFE
+        )
+        seen = {t.lower() for t in topics}
+        for topic in self._memory_topics():
+            if topic.lower() not in seen:
+                topics.append(topic)
+                seen.add(topic.lower())
+        return topics[:NEWS_PREFETCH_MAX_TOPICS]
+
+    def run_cycle(self) -> dict:
+        cache = news_cache.get()
+        if not cache.try_acquire_lease("news_prefetch", self.owner, NEWS_PREFETCH_INTERVAL):
+            return {"skipped": "another worker holds the prefetch lease"}
+
+        started = time.time()
+        refreshed = []
+        for topic in self.topics():
+            if time.time() - started > NEWS_PREFETCH_MAX_SECONDS:
+                break
+            key = cache.search_key(topic, NEWS_TIME_RANGE, NEWS_INCLUDE_DOMAINS)
+            # Still cached when the next cycle comes round: nothing to do.
+            if cache.get_search(key, max_age=NEWS_SEARCH_TTL - NEWS_PREFETCH_INTERVAL):
+                continue
+            try:
+                response = search_news(topic, refresh=True)
+                urls = [r.get("url") for r in response.get("results", []) if r.get("url")]
+                fetch_articles(urls)
+                refreshed.append(topic)
+            except Exception as e:
+                print(f"News prefetch failed for {topic}: {e}")
+
+        self.last_cycle = {
+            "started": started,
+            "seconds": round(time.time() - started, 2),
+            "refreshed": refreshed,
+        }
+        print(f"News prefetch refreshed {len(refreshed)} topics")
+        return self.last_cycle
@@ -0,0 +1,120 @@
+import io
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple
+
+
+# "textract" (AWS) or "tesseract" (local, no network access needed).
+OCR_BACKEND = os.getenv("OCR_BACKEND", "textract").lower()
+# Use the region closest to the deployment; every OCR call is a round trip.
+TEXTRACT_REGION = os.getenv("TEXTRACT_REGION") or os.getenv("AWS_REGION", "us-east-1")
+TESSERACT_LANG = os.getenv("TESSERACT_LANG", "eng")
+TESSERACT_CONFIG = os.getenv("TESSERACT_CONFIG", "--psm 3")
+
+
+class OCREngine(ABC):
+    """
+    An OCR engine returning Textract-style blocks (LINE/WORD, plus
+    KEY_VALUE_SET/TABLE/CELL when it can analyze structure), so the OCR
+    cache and Tools.ocr_structure work the same whichever engine ran.
+    """
+
+    name = "base"
+    supports_structure = False
+
+    @abstractmethod
+    def detect_text(self, image_bytes: bytes) -> List[dict]:
+        """Plain text detection: LINE and WORD blocks."""
+
+    def analyze_document(self, image_bytes: bytes) -> List[dict]:
+        """Forms and tables analysis; plain text for engines without it."""
+        return self.detect_text(image_bytes)
+
+
+class TextractOCR(OCREngine):
+    name = "textract"
+    supports_structure = True
+
+    def __init__(self, region: str = TEXTRACT_REGION):
+        import boto3
+
+        self.region = region
+        self._client = boto3.client("textract", region_name=region)
+
+    def detect_text(self, image_bytes: bytes) -> List[dict]:
+        return self._client.detect_document_text(Document={"Bytes": image_bytes})["Blocks"]
+
+    def analyze_document(self, image_bytes: bytes) -> List[dict]:
+        response = self._client.analyze_document(
+            Document={"Bytes": image_bytes}, FeatureTypes=["FORMS", "TABLES"]
+        )
+        return response["Blocks"]
+
+
+class TesseractOCR(OCREngine):
+    """Local OCR with Tesseract; needs the tesseract binary on PATH."""
+
+    name = "tesseract"
+
+    def __init__(self, lang: str = TESSERACT_LANG, config: str = TESSERACT_CONFIG):
+        import pytesseract
+
+        self.lang = lang
+        self.config = config
+        self._tesseract = pytesseract
+        # Fail at load time, not on the first question, if the binary is missing.
+        pytesseract.get_tesseract_version()
+
+    def detect_text(self, image_bytes: bytes) -> List[dict]:
+        from PIL import Image
+
+        data = self._tesseract.image_to_data(
+            Image.open(io.BytesIO(image_bytes)),
+            lang=self.lang,
+            config=self.config,
+            output_type=self._tesseract.Output.DICT,
+        )
+
+        lines: Dict[Tuple[int, int, int, int], List[dict]] = {}
+        for i, text in enumerate(data["text"]):
+            text = (text or "").strip()
+            if not text:
+                continue
+            line_key = (
+                data["page_num"][i], data["block_num"][i], data["par_num"][i], data["line_num"][i]
+            )
+            lines.setdefault(line_key, []).append({
+                "BlockType": "WORD",
+                "Id": f"w{i}",
+                "Text": text,
+                "Confidence": float(data["conf"][i]),
+            })
+
+        blocks = []
+        for number, line_key in enumerate(sorted(lines), start=1):
+            words = lines[line_key]
+            blocks.append({
+                "BlockType": "LINE",
+                "Id": f"l{number}",
+                "Text": " ".join(w["Text"] for w in words),
+                "Confidence": sum(w["Confidence"] for w in words) / len(words),
+                "Relationships": [{"Type": "CHILD", "Ids": [w["Id"] for w in words]}],
+            })
+            blocks.extend(words)
+        return blocks
+
+
+OCR_ENGINES = {
+    TextractOCR.name: TextractOCR,
+    TesseractOCR.name: TesseractOCR,
+}
+
+
+def load_ocr_engine(name: str = OCR_BACKEND) -> OCREngine:
+    try:
+        engine_cls = OCR_ENGINES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown OCR_BACKEND {name!r}; expected one of {sorted(OCR_ENGINES)}"
+        )
+    return engine_cls()
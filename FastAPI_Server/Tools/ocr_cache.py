@@ -0,0 +1,67 @@
+import os
+import json
+import uuid
+import hashlib
+from typing import List, Optional
+
+from Tools.cache import LRUCache
+from Tools.storage import OCR_CACHE_DIR, storage_manager
+
+
+OCR_MEMORY_CACHE_BYTES = int(os.getenv("OCR_MEMORY_CACHE_BYTES", 32 * 1024 * 1024))
+
+
+def content_hash(data: bytes, *parts: str) -> str:
+    """BLAKE2b of `data`, extended by `parts` (settings the result depends on)."""
+    hasher = hashlib.blake2b(data, digest_size=20)
+    for part in parts:
+        hasher.update(b"\0" + part.encode("utf-8"))
+    return hasher.hexdigest()
+
+
+class OCRCache:
+    """
+    Content-addressed cache of OCR results (the parsed Textract blocks of
+    every page of an image).
+
+    Results live as JSON files in OCR_CACHE_DIR, named by the image hash and
+    the kind of OCR call, so every worker shares them and they survive
+    restarts. The most recently used ones are also kept in memory.
+    """
+
+    def __init__(self, directory: str = OCR_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._memory = LRUCache("ocr_results", max_bytes=OCR_MEMORY_CACHE_BYTES)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[List[List[dict]]]:
+        blocks = self._memory.get(key)
+        if blocks is not None:
+            return blocks
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                blocks = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        storage_manager.touch(path)
+        self._memory.put(key, blocks)
+        return blocks
+
+    def put(self, key: str, blocks: List[List[dict]]) -> None:
+        self._memory.put(key, blocks)
+        path = self._path(key)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(blocks, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write OCR cache entry {key}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
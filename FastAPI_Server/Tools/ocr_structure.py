@@ -0,0 +1,104 @@
+import re
+from typing import Dict, List, Tuple
+
+
+# Questions about layout need Textract's FORMS/TABLES analysis; everything
+# else is answered from plain text detection, which is cheaper and faster.
+STRUCTURE_PATTERN = re.compile(
+    r"\b(tables?|tabular|columns?|rows?|cells?|grid|forms?|fields?|check ?box(es)?|"
+    r"key[- ]value|line items?|breakdown|itemi[sz]ed|filled|fill[- ]up)\b",
+    re.IGNORECASE,
+)
+
+
+def needs_structure(*questions: str) -> bool:
+    return any(STRUCTURE_PATTERN.search(q or "") for q in questions)
+
+
+def _children(block: dict, kind: str = "CHILD") -> List[str]:
+    ids = []
+    for relationship in block.get("Relationships", []):
+        if relationship["Type"] == kind:
+            ids.extend(relationship["Ids"])
+    return ids
+
+
+def _text_of(block: dict, by_id: Dict[str, dict], used: set) -> str:
+    words = []
+    for child_id in _children(block):
+        child = by_id.get(child_id)
+        if child is None:
+            continue
+        used.add(child_id)
+        if child["BlockType"] == "WORD":
+            words.append(child["Text"])
+        elif child["BlockType"] == "SELECTION_ELEMENT":
+            words.append("[x]" if child.get("SelectionStatus") == "SELECTED" else "[ ]")
+    return " ".join(words)
+
+
+def key_values(blocks: List[dict], by_id: Dict[str, dict], used: set) -> List[Tuple[str, str]]:
+    pairs = []
+    for block in blocks:
+        if block["BlockType"] != "KEY_VALUE_SET" or "KEY" not in block.get("EntityTypes", []):
+            continue
+        key = _text_of(block, by_id, used)
+        value = " ".join(
+            _text_of(by_id[value_id], by_id, used)
+            for value_id in _children(block, "VALUE")
+            if value_id in by_id
+        )
+        if key:
+            pairs.append((key, value))
+    return pairs
+
+
+def tables(blocks: List[dict], by_id: Dict[str, dict], used: set) -> List[List[List[str]]]:
+    result = []
+    for block in blocks:
+        if block["BlockType"] != "TABLE":
+            continue
+        cells = {}
+        for cell_id in _children(block):
+            cell = by_id.get(cell_id)
+            if cell is None or cell["BlockType"] != "CELL":
+                continue
+            cells[(cell["RowIndex"], cell["ColumnIndex"])] = _text_of(cell, by_id, used)
+        if not cells:
+            continue
+        rows = max(r for r, _ in cells)
+        columns = max(c for _, c in cells)
+        result.append(
+            [[cells.get((r, c), "") for c in range(1, columns + 1)] for r in range(1, rows + 1)]
+        )
+    return result
+
+
+def format_blocks(blocks: List[dict], structured: bool) -> str:
+    """
+    Turn Textract blocks into prompt text. Plain mode is the LINE text.
+    Structured mode renders key-value pairs and tables compactly and keeps
+    only the lines whose words are not already part of them.
+    """
+    if not structured:
+        return "\n".join(b["Text"] for b in blocks if b["BlockType"] == "LINE")
+
+    by_id = {b["Id"]: b for b in blocks}
+    used: set = set()
+    pairs = key_values(blocks, by_id, used)
+    grids = tables(blocks, by_id, used)
+
+    sections = []
+    lines = [
+        b["Text"]
+        for b in blocks
+        if b["BlockType"] == "LINE" and not set(_children(b)) <= used
+    ]
+    if lines:
+        sections.append("Text:\n" + "\n".join(lines))
+    if pairs:
+        sections.append("Key-value pairs:\n" + "\n".join(f"{k}: {v}" for k, v in pairs))
+    for number, grid in enumerate(grids, start=1):
+        rows = "\n".join("| " + " | ".join(row) + " |" for row in grid)
+        sections.append(f"Table {number}:\n{rows}")
+    return "\n\n".join(sections)
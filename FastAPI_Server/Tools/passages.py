@@ -0,0 +1,166 @@
+import os
+import re
+import math
+from collections import Counter
+from typing import Dict, List
+
+import numpy as np
+
+from Tools.embeddings import embed_query, embeddings_model
+
+
+NEWS_PASSAGE_TOKEN_BUDGET = int(os.getenv("NEWS_PASSAGE_TOKEN_BUDGET", 1500))
+NEWS_PASSAGE_MIN_CHARS = int(os.getenv("NEWS_PASSAGE_MIN_CHARS", 60))
+# Longer paragraphs are split at sentence ends, so an article that comes
+# out of extraction as one block can still be ranked and fit the budget.
+NEWS_PASSAGE_MAX_CHARS = int(os.getenv("NEWS_PASSAGE_MAX_CHARS", 1200))
+# Weight of the BM25 score against the embedding similarity (0..1).
+NEWS_PASSAGE_BM25_WEIGHT = float(os.getenv("NEWS_PASSAGE_BM25_WEIGHT", 0.5))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def truncate(text: str, max_chars: int) -> str:
+    """Cut `text` to at most `max_chars`, at a word boundary when possible."""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    space = cut.rfind(" ")
+    return cut[:space] if space > max_chars // 2 else cut
+
+
+def _split_long(paragraph: str) -> List[str]:
+    if len(paragraph) <= NEWS_PASSAGE_MAX_CHARS:
+        return [paragraph]
+    pieces = []
+    buffer = ""
+    for sentence in _SENTENCE_END_RE.split(paragraph):
+        while len(sentence) > NEWS_PASSAGE_MAX_CHARS:
+            head = truncate(sentence, NEWS_PASSAGE_MAX_CHARS)
+            pieces.append(head)
+            sentence = sentence[len(head):].strip()
+        if buffer and len(buffer) + 1 + len(sentence) > NEWS_PASSAGE_MAX_CHARS:
+            pieces.append(buffer)
+            buffer = ""
+        buffer = f"{buffer} {sentence}" if buffer else sentence
+    if buffer:
+        pieces.append(buffer)
+    return pieces
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """
+    Split extracted article text into paragraphs, merging short fragments
+    and splitting ones longer than NEWS_PASSAGE_MAX_CHARS.
+    """
+    paragraphs = []
+    buffer = ""
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        buffer = f"{buffer} {line}".strip() if buffer else line
+        if len(buffer) >= NEWS_PASSAGE_MIN_CHARS:
+            paragraphs.extend(_split_long(buffer))
+            buffer = ""
+    if buffer:
+        paragraphs.extend(_split_long(buffer))
+    return paragraphs
+
+
+def bm25_scores(query: str, passages: List[str], k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    docs = [tokenize(p) for p in passages]
+    avg_len = sum(len(d) for d in docs) / max(1, len(docs))
+    doc_freq = Counter(term for d in docs for term in set(d))
+    n = len(docs)
+
+    scores = np.zeros(n, dtype=np.float32)
+    for term in set(tokenize(query)):
+        df = doc_freq.get(term)
+        if not df:
+            continue
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        for i, d in enumerate(docs):
+            tf = d.count(term)
+            if tf:
+                scores[i] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(d) / (avg_len or 1)))
+    return scores
+
+
+def dense_scores(query: str, passages: List[str]) -> np.ndarray:
+    query_vector = embed_query(query)
+    vectors = np.asarray(embeddings_model.get().embed_documents(passages), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+    return vectors @ query_vector / np.where(norms == 0, 1.0, norms)
+
+
+def _min_max(scores: np.ndarray) -> np.ndarray:
+    spread = scores.max() - scores.min()
+    if spread == 0:
+        return np.zeros_like(scores)
+    return (scores - scores.min()) / spread
+
+
+def select_passages(
+    query: str,
+    articles: List[Dict[str, str]],
+    token_budget: int = NEWS_PASSAGE_TOKEN_BUDGET,
+) -> List[Dict[str, object]]:
+    """
+    Keep only the paragraphs of `articles` ([{"url", "text"}]) most relevant
+    to `query`, within `token_budget`. Paragraphs are ranked by a mix of BM25
+    and embedding similarity, then returned in their original article order
+    as [{"url", "passages": [...]}], dropping articles with nothing selected.
+    """
+    passages = []
+    for article_index, article in enumerate(articles):
+        for paragraph_index, paragraph in enumerate(split_paragraphs(article["text"])):
+            passages.append((article_index, paragraph_index, paragraph))
+    if not passages:
+        return []
+
+    texts = [p[2] for p in passages]
+    scores = NEWS_PASSAGE_BM25_WEIGHT * _min_max(bm25_scores(query, texts))
+    try:
+        scores = scores + (1 - NEWS_PASSAGE_BM25_WEIGHT) * _min_max(dense_scores(query, texts))
+    except Exception as e:
+        print(f"Embedding passages failed, ranking with BM25 only: {e}")
+
+    chosen = []
+    used = 0
+    for i in np.argsort(-scores):
+        cost = estimate_tokens(texts[i])
+        if used + cost > token_budget:
+            # Too big for what is left: keep its start if that is still
+            # a meaningful passage rather than dropping it altogether.
+            remaining_chars = (token_budget - used - 1) * 4
+            if remaining_chars < NEWS_PASSAGE_MIN_CHARS:
+                continue
+            article_index, paragraph_index, text = passages[i]
+            text = truncate(text, remaining_chars)
+            chosen.append((article_index, paragraph_index, text))
+            used += estimate_tokens(text)
+            continue
+        chosen.append(passages[i])
+        used += cost
+
+    selected = []
+    for article_index, article in enumerate(articles):
+        kept = [p[2] for p in sorted(chosen) if p[0] == article_index]
+        if kept:
+            selected.append({"url": article["url"], "passages": kept})
+    print(
+        f"Selected {len(chosen)} of {len(passages)} passages (~{used} tokens) "
+        f"from {len(articles)} articles"
+    )
+    return selected
@@ -0,0 +1,163 @@
+import os
+import time
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pypdf import PdfReader
+
+from Tools.proc_memory import available_cpus
+
+
+# Pages are split across a process pool in ranges of this many pages; smaller
+# documents are read inline because starting a task costs more than parsing.
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", min(4, available_cpus())))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 16))
+
+# A page needs OCR when most of its text layer is not readable characters
+# (broken font encodings), or when the layer is sparse and the page draws
+# something that may hold more text: embedded images (scans, pasted tables)
+# or a large amount of vector content (text converted to outlines). Short
+# born-digital pages, such as covers or blank pages, keep their own text.
+PDF_MIN_CHARS_PER_PAGE = int(os.getenv("PDF_MIN_CHARS_PER_PAGE", 200))
+PDF_MIN_ALNUM_RATIO = float(os.getenv("PDF_MIN_ALNUM_RATIO", 0.5))
+PDF_VECTOR_CONTENT_BYTES = int(os.getenv("PDF_VECTOR_CONTENT_BYTES", 32 * 1024))
+
+# An OCR backend receives the file path and the zero-based page numbers that
+# need OCR and returns the text of each of those pages.
+OCRBackend = Callable[[str, List[int]], Dict[int, str]]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Spawned workers only import this module, and avoid forking
+                # a multi-threaded server process.
+                _pool = ProcessPoolExecutor(
+                    max_workers=PDF_EXTRACT_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+def is_pdf(file_path: str) -> bool:
+    with open(file_path, "rb") as f:
+        return f.read(5) == b"%PDF-"
+
+
+def _has_images(resources, depth: int = 0) -> bool:
+    xobjects = resources.get("/XObject") if resources else None
+    if not xobjects:
+        return False
+    for xobject in xobjects.get_object().values():
+        xobject = xobject.get_object()
+        subtype = xobject.get("/Subtype")
+        if subtype == "/Image":
+            return True
+        # Images are often wrapped in form XObjects.
+        if subtype == "/Form" and depth < 3:
+            form_resources = xobject.get("/Resources")
+            if form_resources and _has_images(form_resources.get_object(), depth + 1):
+                return True
+    return False
+
+
+def _has_graphics(page) -> bool:
+    """True if the page has images or enough drawing to be outlined text."""
+    resources = page.get("/Resources")
+    if resources and _has_images(resources.get_object()):
+        return True
+    contents = page.get_contents()
+    return contents is not None and len(contents.get_data()) >= PDF_VECTOR_CONTENT_BYTES
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[Tuple[str, bool]]:
+    reader = PdfReader(file_path)
+    pages = []
+    for page_number in range(start, end):
+        try:
+            page = reader.pages[page_number]
+            text = page.extract_text() or ""
+        except Exception as e:
+            print(f"Could not read text layer of page {page_number + 1}: {e}")
+            pages.append(("", True))
+            continue
+        try:
+            has_graphics = _has_graphics(page)
+        except Exception:
+            # Unreadable resources: let OCR look at it if the text is sparse.
+            has_graphics = True
+        pages.append((text, has_graphics))
+    return pages
+
+
+def needs_ocr(text: str, has_graphics: bool) -> bool:
+    visible = [c for c in text if not c.isspace()]
+    if len(visible) < PDF_MIN_CHARS_PER_PAGE:
+        return has_graphics
+    alnum = sum(1 for c in visible if c.isalnum())
+    return alnum / len(visible) < PDF_MIN_ALNUM_RATIO
+
+
+def extract_text_layer(file_path: str) -> List[Tuple[str, bool]]:
+    """
+    Read the embedded text of every page, in parallel for long documents,
+    together with whether the page also has images or heavy vector content.
+    """
+    page_count = len(PdfReader(file_path).pages)
+    if page_count <= PDF_PAGES_PER_TASK or PDF_EXTRACT_WORKERS <= 1:
+        return _extract_page_range(file_path, 0, page_count)
+
+    pool = _get_pool()
+    futures = [
+        pool.submit(
+            _extract_page_range,
+            file_path,
+            start,
+            min(start + PDF_PAGES_PER_TASK, page_count),
+        )
+        for start in range(0, page_count, PDF_PAGES_PER_TASK)
+    ]
+    pages = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+def extract_pdf_text(file_path: str, ocr: OCRBackend) -> str:
+    """
+    Tiered text extraction: read the PDF's own text layer locally and only
+    send the pages without usable text to the OCR backend.
+    """
+    started = time.perf_counter()
+    layer = extract_text_layer(file_path)
+    local_elapsed = time.perf_counter() - started
+
+    pages = [text for text, _ in layer]
+    ocr_pages = [i for i, page in enumerate(layer) if needs_ocr(*page)]
+    print(
+        f"Local text layer read for {len(pages)} pages in {local_elapsed:.2f}s, "
+        f"{len(ocr_pages)} pages need OCR"
+    )
+
+    if ocr_pages:
+        started = time.perf_counter()
+        try:
+            ocr_texts = ocr(file_path, ocr_pages)
+        except Exception as e:
+            # The rest of the document is already read; those pages keep
+            # whatever their text layer had.
+            print(f"OCR of {len(ocr_pages)} pages failed: {e}. Keeping their text layer.")
+            ocr_texts = {}
+        for page_number in ocr_pages:
+            # Keep whatever the text layer had if OCR returned nothing.
+            pages[page_number] = ocr_texts.get(page_number) or pages[page_number]
+        print(f"OCR of {len(ocr_pages)} pages took {time.perf_counter() - started:.2f}s")
+
+    return "\n\n".join(page for page in pages if page.strip())
@@ -0,0 +1,106 @@
+import os
+import math
+from typing import List, Optional, Union
+
+
+# Each worker also starts its own PDF and article extraction process pools,
+# so the default number of workers stays small even on large machines.
+MAX_DEFAULT_WORKERS = 4
+
+
+def process_memory(pid: Union[int, str] = "self") -> Optional[dict]:
+    """
+    Memory of a process from /proc/<pid>/smaps_rollup (Linux only), in bytes.
+    USS (private pages) is what the process really costs; pages shared
+    copy-on-write with the gunicorn master show up under `shared`.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1]) * 1024
+    except OSError:
+        return None
+    return {
+        "pid": os.getpid() if pid == "self" else int(pid),
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+    }
+
+
+def _cmdline(pid: Union[int, str]) -> Optional[bytes]:
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def sibling_workers() -> List[int]:
+    """PIDs of the worker processes forked from the same master as this one."""
+    parent = os.getppid()
+    own = _cmdline("self")
+    pids = []
+    for name in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "r") as f:
+                # The command name is parenthesised and may contain spaces.
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == parent and _cmdline(name) == own:
+            pids.append(int(name))
+    return sorted(pids)
+
+
+def worker_memory_report() -> dict:
+    workers = [m for m in (process_memory(pid) for pid in sibling_workers()) if m]
+    return {
+        "master": process_memory(os.getppid()),
+        "workers": workers,
+        "total_uss": sum(w["uss"] for w in workers),
+    }
+
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    """CPU quota of this container in CPUs (cgroup v2, then v1), if any."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r") as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "r") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", "r") as f:
+            period = int(f.read())
+    except (OSError, ValueError):
+        return None
+    return quota / period if quota > 0 and period > 0 else None
+
+
+def available_cpus() -> int:
+    """
+    CPUs this process can actually use: its affinity mask capped by the
+    cgroup quota. os.cpu_count() reports the host's CPUs inside a container.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+def default_web_concurrency() -> int:
+    """Worker processes to run when WEB_CONCURRENCY is not set."""
+    return min(available_cpus(), MAX_DEFAULT_WORKERS)
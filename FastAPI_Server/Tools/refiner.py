@@ -1,14 +1,26 @@
 from typing import Dict, Any
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.tools import tool
 from dotenv import load_dotenv
 from typing import List, Union
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, BaseMessage
+from Tools.lazy import LazyResource
 
 
 load_dotenv(override=True)
 
 
+def _load_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.0-flash",
+        temperature=0,
+    )
+
+
+refiner_llm = LazyResource("refiner_llm", _load_llm)
+
+
 @tool
 def ContentRefiner(
     query: str,
@@ -42,10 +54,7 @@ def ContentRefiner(
         --- Prior History ---
         {history_str}
         """
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            temperature=0,
-        )
+        llm = refiner_llm.get()
         system_prompt = """You are a Content Refinement AI with advanced capabilities in:
             Summarizing and distilling complex information
 
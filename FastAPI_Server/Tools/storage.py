@@ -0,0 +1,277 @@
+import os
+import time
+import shutil
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+
+UPLOADS_DIR = "uploads"
+FAISS_CACHE_DIR = "./faiss_cache"
+OCR_CACHE_DIR = "./ocr_cache"
+# Pins are shared by all workers through this database (the checkpoint
+# database by default), so no worker evicts files another one is using.
+STORAGE_DB = os.getenv("STORAGE_DB", os.getenv("SQLITE_DB_PATH", "checkpoints.sqlite"))
+
+GIB = 1024 ** 3
+
+
+class StorageManager:
+    """
+    Keeps managed directories (uploads/, faiss_cache/, ocr_cache/) under a byte quota.
+
+    Every top-level entry of a managed directory (a file or a cache directory)
+    is one eviction unit. When a directory goes over its quota the least
+    recently used entries are deleted until usage drops below
+    `low_watermark * quota`. Entries pinned by an active session, or derived
+    from a pinned upload (e.g. the FAISS index of a pinned PDF), are never
+    evicted.
+
+    Last access is the entry's mtime and pins live in SQLite, so the
+    sweepers of all worker processes see the same state.
+    """
+
+    # Half-written entries (e.g. `<hash>.tmp-<uuid>` index directories) are
+    # left alone while young and removed once they are clearly abandoned.
+    TMP_MARKER = ".tmp-"
+    TMP_MAX_AGE = 3600
+
+    def __init__(
+        self,
+        quotas: Dict[str, int],
+        session_ttl: float = 3600,
+        low_watermark: float = 0.9,
+        db_path: str = STORAGE_DB,
+    ):
+        self.quotas = {os.path.abspath(d): q for d, q in quotas.items()}
+        self.session_ttl = session_ttl
+        self.low_watermark = low_watermark
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._registered: Set[Tuple[str, str]] = set()
+        self._pin_sources: List[Callable[[], Iterable[str]]] = []
+        self._stats = {
+            d: {"evicted_entries": 0, "evicted_bytes": 0, "last_sweep": None}
+            for d in self.quotas
+        }
+
+    # ---- bookkeeping ----------------------------------------------------
+
+    def _db(self) -> sqlite3.Connection:
+        """Connection of this process (the app is imported before forking)."""
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(
+                self.db_path, check_same_thread=False, timeout=10, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS storage_pins (
+                    owner TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    pinned_at REAL NOT NULL,
+                    PRIMARY KEY (owner, path)
+                );
+                CREATE TABLE IF NOT EXISTS storage_derived (
+                    source TEXT NOT NULL,
+                    derived TEXT NOT NULL,
+                    PRIMARY KEY (source, derived)
+                );
+                """
+            )
+            self._conn, self._conn_pid = conn, os.getpid()
+            self._registered = set()
+        return self._conn
+
+    def touch(self, path: str) -> None:
+        """Record an access by bumping mtime, which every worker sees."""
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+
+    def register_derived(self, source: str, derived: str) -> None:
+        """Mark `derived` as built from `source`, so pinning one keeps both."""
+        pair = (os.path.abspath(source), os.path.abspath(derived))
+        with self._lock:
+            if pair in self._registered and self._conn_pid == os.getpid():
+                return
+            self._db().execute("INSERT OR IGNORE INTO storage_derived VALUES (?, ?)", pair)
+            self._registered.add(pair)
+
+    def pin(self, owner: str, path: str) -> None:
+        """Keep `path` while `owner` (a user/session thread) is active."""
+        path = os.path.abspath(path)
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO storage_pins VALUES (?, ?, ?)",
+                (owner, path, time.time()),
+            )
+        self.touch(path)
+
+    def refresh(self, owner: str) -> None:
+        """Extend the pins of an owner that is still active."""
+        with self._lock:
+            self._db().execute(
+                "UPDATE storage_pins SET pinned_at = ? WHERE owner = ?",
+                (time.time(), owner),
+            )
+
+    def add_pin_source(self, source: Callable[[], Iterable[str]]) -> None:
+        """
+        Also keep the paths `source()` returns, e.g. the uploads of queued
+        jobs, which must outlive any session TTL. Sources must read shared
+        state so the sweeper of every worker sees them.
+        """
+        self._pin_sources.append(source)
+
+    def _pinned_paths(self) -> Set[str]:
+        pinned = set()
+        for source in self._pin_sources:
+            try:
+                pinned.update(os.path.abspath(path) for path in source())
+            except Exception as e:
+                # Unknown pins: skip this sweep rather than evict in-use files.
+                raise RuntimeError(f"Could not read pinned paths: {e}") from e
+
+        cutoff = time.time() - self.session_ttl
+        with self._lock:
+            conn = self._db()
+            conn.execute("DELETE FROM storage_pins WHERE pinned_at < ?", (cutoff,))
+            pinned.update(row[0] for row in conn.execute("SELECT path FROM storage_pins"))
+            derived = conn.execute("SELECT source, derived FROM storage_derived").fetchall()
+        pinned.update(path for source, path in derived if source in pinned)
+        return pinned
+
+    # ---- scanning -------------------------------------------------------
+
+    def _scan_entry(self, path: str):
+        """Return (size_bytes, last_access) for a file or a directory tree."""
+        st = os.stat(path)
+        size = st.st_size
+        last = max(st.st_atime, st.st_mtime)
+        if os.path.isdir(path):
+            size = 0
+            for root, _, files in os.walk(path):
+                for name in files:
+                    try:
+                        fst = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    size += fst.st_size
+                    last = max(last, fst.st_atime, fst.st_mtime)
+        return size, last
+
+    def _scan(self, directory: str) -> List[dict]:
+        entries = []
+        if not os.path.isdir(directory):
+            return entries
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            try:
+                size, last = self._scan_entry(path)
+            except OSError:
+                continue
+            entries.append({"path": path, "size": size, "last_access": last})
+        return entries
+
+    def _remove(self, path: str) -> None:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._db().execute(
+                "DELETE FROM storage_derived WHERE source = ? OR derived = ?", (path, path)
+            )
+            self._registered = {p for p in self._registered if path not in p}
+
+    # ---- eviction -------------------------------------------------------
+
+    def sweep(self) -> Dict[str, dict]:
+        """Evict LRU entries from every directory that is over quota."""
+        pinned = self._pinned_paths()
+        now = time.time()
+        report = {}
+
+        for directory, quota in self.quotas.items():
+            entries = self._scan(directory)
+            evicted_entries = 0
+            evicted_bytes = 0
+
+            for entry in list(entries):
+                if self.TMP_MARKER in os.path.basename(entry["path"]):
+                    entries.remove(entry)
+                    if now - entry["last_access"] > self.TMP_MAX_AGE:
+                        self._remove(entry["path"])
+                        evicted_entries += 1
+                        evicted_bytes += entry["size"]
+
+            used = sum(e["size"] for e in entries)
+            if used > quota:
+                target = quota * self.low_watermark
+                for entry in sorted(entries, key=lambda e: e["last_access"]):
+                    if used <= target:
+                        break
+                    if entry["path"] in pinned:
+                        continue
+                    self._remove(entry["path"])
+                    used -= entry["size"]
+                    evicted_entries += 1
+                    evicted_bytes += entry["size"]
+
+            if evicted_entries:
+                print(
+                    f"Storage sweep evicted {evicted_entries} entries "
+                    f"({evicted_bytes} bytes) from {directory}"
+                )
+
+            with self._lock:
+                stats = self._stats[directory]
+                stats["evicted_entries"] += evicted_entries
+                stats["evicted_bytes"] += evicted_bytes
+                stats["last_sweep"] = now
+            report[directory] = {
+                "evicted_entries": evicted_entries,
+                "evicted_bytes": evicted_bytes,
+            }
+        return report
+
+    def stats(self) -> Dict[str, dict]:
+        pinned = self._pinned_paths()
+        with self._lock:
+            active_sessions = self._db().execute(
+                "SELECT COUNT(DISTINCT owner) FROM storage_pins"
+            ).fetchone()[0]
+        result = {}
+        for directory, quota in self.quotas.items():
+            entries = self._scan(directory)
+            used = sum(e["size"] for e in entries)
+            with self._lock:
+                totals = dict(self._stats[directory])
+            result[directory] = {
+                "quota_bytes": quota,
+                "used_bytes": used,
+                "usage_ratio": round(used / quota, 4) if quota else None,
+                "entries": len(entries),
+                "pinned_entries": sum(1 for e in entries if e["path"] in pinned),
+                **totals,
+            }
+        return {"directories": result, "active_sessions": active_sessions}
+
+
+storage_manager = StorageManager(
+    quotas={
+        UPLOADS_DIR: int(os.getenv("UPLOADS_QUOTA_BYTES", 5 * GIB)),
+        FAISS_CACHE_DIR: int(os.getenv("FAISS_CACHE_QUOTA_BYTES", 10 * GIB)),
+        OCR_CACHE_DIR: int(os.getenv("OCR_CACHE_QUOTA_BYTES", 2 * GIB)),
+    },
+    session_ttl=float(os.getenv("STORAGE_SESSION_TTL", 3600)),
+    low_watermark=float(os.getenv("STORAGE_LOW_WATERMARK", 0.9)),
+)
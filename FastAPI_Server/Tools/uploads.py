@@ -0,0 +1,104 @@
+import os
+import re
+import uuid
+import asyncio
+import hashlib
+from dataclasses import dataclass
+
+from fastapi import UploadFile
+
+from Tools.storage import UPLOADS_DIR, storage_manager
+
+
+MIB = 1024 * 1024
+
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", 1 * MIB))
+MAX_DOCUMENT_BYTES = int(os.getenv("MAX_DOCUMENT_BYTES", 100 * MIB))
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", 25 * MIB))
+# Whole multipart request; checked against Content-Length before parsing.
+MAX_REQUEST_UPLOAD_BYTES = int(os.getenv("MAX_REQUEST_UPLOAD_BYTES", 200 * MIB))
+
+_EXTENSION_RE = re.compile(r"^\.[a-z0-9]{1,10}$")
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, name: str, limit: int):
+        super().__init__(f"{name} is larger than the {limit // MIB} MiB limit")
+        self.limit = limit
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    digest: str
+    size: int
+    name: str
+
+
+def new_hasher():
+    """Content hash for uploads; same digest as Tools.ocr_cache.content_hash."""
+    return hashlib.blake2b(digest_size=20)
+
+
+def file_digest(path: str) -> str:
+    hasher = new_hasher()
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_BYTES):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _write_chunk(f, hasher, chunk: bytes) -> None:
+    hasher.update(chunk)
+    f.write(chunk)
+
+
+def _commit(tmp_path: str, path: str) -> None:
+    if os.path.exists(path):
+        # Same content was uploaded before: keep the existing copy.
+        os.remove(tmp_path)
+        storage_manager.touch(path)
+    else:
+        os.replace(tmp_path, path)
+
+
+async def store_upload(upload: UploadFile, max_bytes: int) -> StoredUpload:
+    """
+    Stream an upload into UPLOADS_DIR in UPLOAD_CHUNK_BYTES chunks, hashing
+    it on the way, and move it atomically to `<digest><ext>` so identical
+    uploads share one file. Raises UploadTooLarge as soon as `max_bytes`
+    is exceeded; disk work runs off the event loop.
+    """
+    name = upload.filename or "upload"
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLarge(name, max_bytes)
+
+    extension = os.path.splitext(name)[1].lower()
+    if not _EXTENSION_RE.match(extension):
+        extension = ""
+
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    # The ".tmp-" marker keeps the storage sweeper off half-written files.
+    tmp_path = os.path.join(UPLOADS_DIR, f"upload.tmp-{uuid.uuid4().hex}")
+    hasher = new_hasher()
+    size = 0
+    f = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        try:
+            while chunk := await upload.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(name, max_bytes)
+                await asyncio.to_thread(_write_chunk, f, hasher, chunk)
+        finally:
+            await asyncio.to_thread(f.close)
+        digest = hasher.hexdigest()
+        path = os.path.join(UPLOADS_DIR, f"{digest}{extension}")
+        await asyncio.to_thread(_commit, tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return StoredUpload(path=path, digest=digest, size=size, name=name)
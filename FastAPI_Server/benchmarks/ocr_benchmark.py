@@ -0,0 +1,143 @@
+"""
+Compare OCR engines on a fixed, synthetic set of statement-like images.
+
+    python benchmarks/ocr_benchmark.py --engines textract,tesseract --images 20 --concurrency 4
+
+The image set is generated deterministically (same seed, same images), so
+runs are comparable across machines and engines. Each engine is measured
+sequentially for per-image latency and then on a thread pool for
+throughput; accuracy is the character similarity to the rendered text.
+The OCR cache is bypassed. Pass --image-dir to benchmark real images
+instead (accuracy is then not reported).
+"""
+import os
+import io
+import sys
+import time
+import random
+import argparse
+import difflib
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Tools.ocr_backend import OCR_ENGINES, load_ocr_engine
+from Tools.ocr_structure import format_blocks
+
+
+DESCRIPTIONS = [
+    "Opening balance", "Salary credit", "Card payment", "ATM withdrawal",
+    "Interest earned", "Utility bill", "Transfer to savings", "Insurance premium",
+    "Dividend received", "Service charge", "Mortgage payment", "Closing balance",
+]
+
+
+def _font(size: int):
+    for name in ("DejaVuSans.ttf", "Arial.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def synthetic_image(rng: random.Random, rows: int) -> Tuple[bytes, str]:
+    """A bank-statement-like page and the text rendered on it."""
+    lines = [f"STATEMENT OF ACCOUNT {rng.randint(10000000, 99999999)}"]
+    for _ in range(rows):
+        lines.append(
+            f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024  "
+            f"{rng.choice(DESCRIPTIONS)}  {rng.uniform(5, 9999):,.2f}"
+        )
+
+    font = _font(28)
+    image = Image.new("L", (1600, 120 + 48 * len(lines)), color=255)
+    draw = ImageDraw.Draw(image)
+    for number, line in enumerate(lines):
+        draw.text((60, 60 + 48 * number), line, fill=0, font=font)
+
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue(), "\n".join(lines)
+
+
+def image_set(count: int, seed: int) -> List[Tuple[bytes, Optional[str]]]:
+    rng = random.Random(seed)
+    return [synthetic_image(rng, rng.randint(8, 30)) for _ in range(count)]
+
+
+def load_image_dir(path: str) -> List[Tuple[bytes, Optional[str]]]:
+    images = []
+    for name in sorted(os.listdir(path)):
+        if name.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".tiff")):
+            with open(os.path.join(path, name), "rb") as f:
+                images.append((f.read(), None))
+    return images
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def benchmark(engine, images, concurrency: int) -> dict:
+    # One untimed call so connection setup / model loading is not counted.
+    engine.detect_text(images[0][0])
+
+    latencies, similarities = [], []
+    for image_bytes, expected in images:
+        started = time.perf_counter()
+        blocks = engine.detect_text(image_bytes)
+        latencies.append(time.perf_counter() - started)
+        if expected is not None:
+            text = format_blocks(blocks, structured=False)
+            similarities.append(difflib.SequenceMatcher(None, expected, text).ratio())
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(engine.detect_text, [image_bytes for image_bytes, _ in images]))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "images_per_s": len(images) / elapsed,
+        "accuracy": statistics.mean(similarities) if similarities else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--engines", default=",".join(OCR_ENGINES))
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--image-dir")
+    args = parser.parse_args()
+
+    images = load_image_dir(args.image_dir) if args.image_dir else image_set(args.images, args.seed)
+    if not images:
+        parser.error("no images to benchmark")
+    print(f"{len(images)} images, concurrency {args.concurrency}\n")
+    print(f"{'engine':<12}{'p50 ms':>10}{'p95 ms':>10}{'img/s':>10}{'accuracy':>10}")
+
+    for name in args.engines.split(","):
+        try:
+            engine = load_ocr_engine(name.strip())
+        except Exception as e:
+            print(f"{name:<12}unavailable: {e}")
+            continue
+        result = benchmark(engine, images, args.concurrency)
+        accuracy = f"{result['accuracy']:.3f}" if result["accuracy"] is not None else "-"
+        print(
+            f"{name:<12}{result['p50_ms']:>10.0f}{result['p95_ms']:>10.0f}"
+            f"{result['images_per_s']:>10.2f}{accuracy:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Production launcher: gunicorn -c gunicorn.conf.py Main:app
+
+The app is imported in the master (preload_app) and the read-only assets
+in PREFORK_RESOURCES are built there before the workers are forked, so
+every worker shares their pages copy-on-write instead of loading its own
+copy. Only fork-safe resources belong in that list: API clients (gRPC,
+httpx, boto3) hold sockets and threads and are built per worker by the
+lifespan warm-up instead.
+"""
+import gc
+import os
+import sys
+
+# gunicorn only puts the app directory on sys.path after reading this file.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from Tools.proc_memory import default_web_concurrency
+
+# Tokenizers would otherwise start a thread pool in the master.
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8080)}"
+workers = int(os.getenv("WEB_CONCURRENCY", default_web_concurrency()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Graph runs (LLM calls, OCR, indexing) can legitimately take minutes.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 300))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 60))
+keepalive = 5
+
+PREFORK_RESOURCES = [
+    r for r in os.getenv("PREFORK_RESOURCES", "embeddings_model").split(",") if r
+]
+
+# Objects allocated while importing the app are never collected; keeping the
+# collector off until the fork stops it from touching (and so copying) them.
+gc.disable()
+
+
+def _mib(value: int) -> str:
+    return f"{value / (1024 * 1024):.1f} MiB"
+
+
+# The hooks import the rest of Tools lazily, keeping the config cheap to read.
+def when_ready(server):
+    from Tools.lazy import warm_up
+    from Tools.proc_memory import process_memory
+
+    warm_up(PREFORK_RESOURCES)
+    # Move everything allocated so far out of the collector's reach, so
+    # collections in the workers do not write to the shared pages.
+    gc.freeze()
+    usage = process_memory()
+    if usage:
+        server.log.info(
+            "Master ready with %s preloaded: RSS %s, USS %s",
+            ",".join(PREFORK_RESOURCES) or "nothing",
+            _mib(usage["rss"]),
+            _mib(usage["uss"]),
+        )
+
+
+def post_fork(server, worker):
+    gc.enable()
+
+
+def post_worker_init(worker):
+    from Tools.proc_memory import process_memory
+
+    usage = process_memory()
+    if usage:
+        worker.log.info(
+            "Worker %s started: USS %s, shared %s",
+            worker.pid,
+            _mib(usage["uss"]),
+            _mib(usage["shared"]),
+        )
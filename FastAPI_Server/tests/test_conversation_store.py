@@ -0,0 +1,251 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from Tools.conversation_store import (
+    ConversationStore,
+    InProcessBackend,
+    SessionBusy,
+    SQLiteBackend,
+)
+
+
+def turn(question, answer):
+    return [HumanMessage(content=question), AIMessage(content=answer)]
+
+
+def make_store(history=None, backend=None, **kwargs):
+    """Store (in-process backend by default) whose rebuild replays `history`."""
+    calls = []
+
+    async def rebuild(user_id, session_id):
+        calls.append((user_id, session_id))
+        return list(history or [])
+
+    return ConversationStore(rebuild, backend or InProcessBackend(), **kwargs), calls
+
+
+def test_rebuilds_from_checkpoint_history_once():
+    history = turn("q1", "a1") + turn("q2", "a2") + turn("q3", "a3")
+    store, calls = make_store(history, window=4)
+
+    async def scenario():
+        first = await store.get("user", "session")
+        await store.append("user", "session", turn("q4", "a4"))
+        second = await store.get("user", "session")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert [m.content for m in first] == ["q2", "a2", "q3", "a3"]
+    assert [m.content for m in second] == ["q3", "a3", "q4", "a4"]
+    assert calls == [("user", "session")]
+    assert store.stats()["rebuilds"] == 1
+
+
+def test_rebuild_failure_starts_an_empty_session():
+    async def rebuild(user_id, session_id):
+        raise RuntimeError("checkpoint database unavailable")
+
+    store = ConversationStore(rebuild, InProcessBackend())
+
+    assert asyncio.run(store.get("user", "session")) == []
+
+
+def test_contending_turns_run_one_after_another():
+    store, _ = make_store(lock_ttl=5, lock_wait=5)
+    events = []
+
+    async def run_turn(name):
+        async with store.session_lock("user", "session"):
+            events.append(f"{name} start")
+            await asyncio.sleep(0.2)
+            events.append(f"{name} end")
+
+    async def scenario():
+        await asyncio.gather(run_turn("a"), run_turn("b"))
+
+    asyncio.run(scenario())
+
+    assert events in (
+        ["a start", "a end", "b start", "b end"],
+        ["b start", "b end", "a start", "a end"],
+    )
+
+
+def test_contending_turn_gives_up_after_lock_wait():
+    store, _ = make_store(lock_ttl=5, lock_wait=0.2)
+
+    async def scenario():
+        async with store.session_lock("user", "session"):
+            with pytest.raises(SessionBusy):
+                async with store.session_lock("user", "session"):
+                    pass
+        # Released by its holder: the session is free again.
+        async with store.session_lock("user", "session"):
+            pass
+
+    asyncio.run(scenario())
+
+
+def test_lock_is_renewed_while_the_turn_runs():
+    store, _ = make_store(lock_ttl=0.3, lock_wait=0.1)
+
+    async def scenario():
+        async with store.session_lock("user", "session"):
+            # Well past the TTL: without renewal another turn would get in.
+            await asyncio.sleep(1.0)
+            with pytest.raises(SessionBusy):
+                async with store.session_lock("user", "session"):
+                    pass
+
+    asyncio.run(scenario())
+    assert store.stats()["locks_lost"] == 0
+
+
+def test_release_only_drops_the_owners_lock():
+    backend = InProcessBackend()
+
+    assert backend.acquire("session", "a", ttl=5)
+    assert not backend.acquire("session", "b", ttl=5)
+    backend.release("session", "b")
+    assert not backend.acquire("session", "b", ttl=5)
+    assert not backend.renew("session", "b", ttl=5)
+    backend.release("session", "a")
+    assert backend.acquire("session", "b", ttl=5)
+
+
+# SQLiteBackend: each backend instance stands for one gunicorn worker
+# sharing the database file.
+
+
+def test_sqlite_stores_share_session_history(tmp_path):
+    db = str(tmp_path / "conversations.sqlite")
+    history = turn("q1", "a1")
+    first, first_calls = make_store(history, backend=SQLiteBackend(db), window=6)
+    second, second_calls = make_store(history, backend=SQLiteBackend(db), window=6)
+
+    async def scenario():
+        rebuilt = await first.get("user", "session")
+        await first.append("user", "session", turn("q2", "a2"))
+        await second.append("user", "session", turn("q3", "a3"))
+        return rebuilt, await second.get("user", "session")
+
+    rebuilt, shared = asyncio.run(scenario())
+
+    assert [m.content for m in rebuilt] == ["q1", "a1"]
+    assert [m.content for m in shared] == ["q1", "a1", "q2", "a2", "q3", "a3"]
+    assert first_calls == [("user", "session")]
+    assert second_calls == []
+
+
+def test_sqlite_idle_session_is_rebuilt(tmp_path):
+    db = str(tmp_path / "conversations.sqlite")
+    store, calls = make_store(turn("q1", "a1"), backend=SQLiteBackend(db, idle_ttl=0.2))
+
+    async def scenario():
+        await store.get("user", "session")
+        await asyncio.sleep(0.3)
+        # Expired: the append is dropped and the next get rebuilds.
+        await store.append("user", "session", turn("q2", "a2"))
+        return await store.get("user", "session")
+
+    messages = asyncio.run(scenario())
+
+    assert [m.content for m in messages] == ["q1", "a1"]
+    assert len(calls) == 2
+
+
+def test_sqlite_contending_stores_serialize_turns(tmp_path):
+    db = str(tmp_path / "conversations.sqlite")
+    stores = [
+        make_store(backend=SQLiteBackend(db), lock_ttl=5, lock_wait=5)[0] for _ in range(2)
+    ]
+    events = []
+
+    async def run_turn(name, store):
+        async with store.session_lock("user", "session"):
+            events.append(f"{name} start")
+            await asyncio.sleep(0.2)
+            events.append(f"{name} end")
+
+    async def scenario():
+        await asyncio.gather(run_turn("a", stores[0]), run_turn("b", stores[1]))
+
+    asyncio.run(scenario())
+
+    assert events in (
+        ["a start", "a end", "b start", "b end"],
+        ["b start", "b end", "a start", "a end"],
+    )
+
+
+def test_sqlite_busy_session_raises_for_other_store(tmp_path):
+    db = str(tmp_path / "conversations.sqlite")
+    holder, _ = make_store(backend=SQLiteBackend(db), lock_ttl=5, lock_wait=5)
+    waiter, _ = make_store(backend=SQLiteBackend(db), lock_ttl=5, lock_wait=0.2)
+
+    async def scenario():
+        async with holder.session_lock("user", "session"):
+            with pytest.raises(SessionBusy):
+                async with waiter.session_lock("user", "session"):
+                    pass
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_expired_lease_is_taken_over(tmp_path):
+    db = str(tmp_path / "conversations.sqlite")
+    crashed, survivor = SQLiteBackend(db), SQLiteBackend(db)
+
+    assert crashed.acquire("session", "a", ttl=0.2)
+    assert not survivor.acquire("session", "b", ttl=5)
+    time.sleep(0.3)
+    assert survivor.acquire("session", "b", ttl=5)
+    # The old holder can neither renew nor release the new holder's lease.
+    assert not crashed.renew("session", "a", ttl=5)
+    crashed.release("session", "a")
+    assert not crashed.acquire("session", "a", ttl=5)
+
+
+def test_sqlite_renewal_extends_the_lease(tmp_path):
+    db = str(tmp_path / "conversations.sqlite")
+    holder, other = SQLiteBackend(db), SQLiteBackend(db)
+
+    assert holder.acquire("session", "a", ttl=0.3)
+    time.sleep(0.2)
+    assert holder.renew("session", "a", ttl=0.3)
+    time.sleep(0.2)
+    # Past the original expiry, but within the renewed one.
+    assert not other.acquire("session", "b", ttl=5)
+    holder.release("session", "a")
+    assert other.acquire("session", "b", ttl=5)
+
+
+def test_sqlite_store_renews_lease_while_turn_runs(tmp_path):
+    db = str(tmp_path / "conversations.sqlite")
+    holder, _ = make_store(backend=SQLiteBackend(db), lock_ttl=0.3, lock_wait=5)
+    waiter, _ = make_store(backend=SQLiteBackend(db), lock_ttl=0.3, lock_wait=0.1)
+
+    async def scenario():
+        async with holder.session_lock("user", "session"):
+            await asyncio.sleep(1.0)
+            with pytest.raises(SessionBusy):
+                async with waiter.session_lock("user", "session"):
+                    pass
+
+    asyncio.run(scenario())
+    assert holder.stats()["locks_lost"] == 0
+
+
+def test_sqlite_periodic_expiry_deletes_idle_sessions(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "conversations.sqlite"), idle_ttl=0.2)
+    backend.EXPIRE_EVERY = 2
+
+    backend.save("idle", [])
+    time.sleep(0.3)
+    backend.save("active", [])
+
+    assert backend.stats() == {"entries": 1, "expired": 1}